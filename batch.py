@@ -0,0 +1,189 @@
+"""Headless batch runs over grids of parameters, configured by config.ini.
+
+    python batch.py                                   run the sweep in config.ini
+    python batch.py --set size=15,50 --set mutation_rate=0.015,0.05
+    python batch.py --repeats 5 --workers 8 --output sweep.npz
+
+Every combination of the swept values is a configuration, run REPEATS times with
+different seeds across a process pool. The results hold one row per generation of
+every run, stored column by column in an .npz file: the parameters of the run
+followed by the generation's best, average and worst fitness, its diversity and its
+timings. Load them with numpy.load.
+"""
+import argparse
+import itertools
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import genalg.alg as ga
+from genalg.biology import *
+from blique import Blique, Environment
+
+# Misspelled keys accepted from older config files
+aliases = {'wdith': 'width'}
+
+defaults = {
+    'generations': 50,
+    'size': 15,
+    'tournament_size': 10,
+    'method': 'tournament',
+    'mutation_rate': Genome.mutation_rate,
+    'substitution_rate': Genome.substitution_rate,
+    'insertion_rate': Genome.insertion_rate,
+    'deletion_rate': 0,
+    'genome_length': Blique.genome_length,
+    'max_age': Blique.max_age,
+    'blique_height': Blique.height,
+    'blique_width': Blique.width,
+    'height': 40,
+    'width': 120,
+    'scenarios': 0,
+    'patience': 0,
+    'seed': 0,
+}
+
+stats = ['generation', 'best', 'average', 'worst', 'diversity', 'evaluate_seconds', 'step_seconds']
+
+def parse_value(text):
+    """Returns TEXT as an int, float or bool if it is one, otherwise as a string. A
+    comma separated TEXT becomes a list of values."""
+    if ',' in text:
+        return [parse_value(t) for t in text.split(',') if t.strip()]
+    text = text.strip()
+    if text in ('True', 'False'):
+        return text == 'True'
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+def read_config(path):
+    """Reads a config file of '#Section' lines each followed by 'Key: value' lines.
+    Returns a dict from lowercased section names to dicts of lowercased keys and
+    parsed values."""
+    config, section = {}, None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#'):
+                section = config.setdefault(line[1:].strip().lower(), {})
+            elif ':' in line and section is not None:
+                key, value = line.split(':', 1)
+                key = key.strip().lower()
+                section[aliases.get(key, key)] = parse_value(value)
+    return config
+
+def base_parameters(config):
+    """Returns the default parameters with the Blique and Environment sizes of CONFIG.
+    Environment sizes below 1 leave the default size."""
+    params = dict(defaults)
+    blique = config.get('blique', {})
+    params['blique_height'] = blique.get('height', params['blique_height'])
+    params['blique_width'] = blique.get('width', params['blique_width'])
+    environment = config.get('environment', {})
+    for key in ('height', 'width'):
+        if environment.get(key, 0) > 0:
+            params[key] = environment[key]
+    return params
+
+def expand(params, sweep, repeats=1):
+    """Returns a configuration for every combination of the values in SWEEP, a dict
+    from parameter names to lists of values, each repeated REPEATS times with
+    consecutive seeds. Parameters that are not swept are taken from PARAMS. Raises a
+    ValueError for unknown parameters and genomes too short for a brain."""
+    unknown = set(sweep) - set(params)
+    if unknown:
+        raise ValueError('Unknown parameters: {}'.format(', '.join(sorted(unknown))))
+    shortest = min(sweep.get('genome_length', []) + [params['genome_length']])
+    if Blique.conv_size(shortest) < 1:
+        raise ValueError('genome_length must be at least {} bits for the brain to have a node'.format(
+            3 * (Blique.senses + 4)))
+    keys = sorted(sweep)
+    configs = []
+    for values in itertools.product(*[sweep[k] for k in keys]):
+        for repeat in range(repeats):
+            config = dict(params, **dict(zip(keys, values)))
+            config['seed'] = params['seed'] + repeat
+            configs.append(config)
+    return configs
+
+def run_config(params):
+    """Evolves a population headless with PARAMS, returning one tuple of stats per
+    generation. Class level settings are all set here, as pool workers are reused."""
+    random.seed(params['seed'])
+    Genome.mutation_rate = params['mutation_rate']
+    Genome.substitution_rate = params['substitution_rate']
+    Genome.insertion_rate = params['insertion_rate']
+    Genome.deletion_rate = params['deletion_rate']
+    Blique.genome_length = params['genome_length']
+    Blique.max_age = params['max_age']
+    Blique.height, Blique.width = params['blique_height'], params['blique_width']
+
+    env = Environment(params['height'], params['width'], [])
+    Blique.start = env.find_start(Blique.width, Blique.height)
+    if params['scenarios']:
+        env.set_scenarios(env.random_scenarios(params['scenarios'], Blique.width, Blique.height, params['seed']))
+
+    def evaluate(pop):
+        env.set_population(pop)
+        env.simulate(vectorized=True)
+
+    rows = []
+    pop = Population(size=params['size'], member=Blique)
+    for g in ga.stepper(pop, params['generations'], params['tournament_size'], method=params['method'],
+                        evaluate=evaluate, patience=params['patience']):
+        rows.append((g.generation, g.best, g.average, g.fitness.min(), g.diversity,
+                     g.evaluate_seconds, g.step_seconds))
+    return rows
+
+def run(configs, workers=None, report=print):
+    """Runs every configuration in CONFIGS across WORKERS processes, or in this process
+    if WORKERS is 0, reporting each as it finishes. Returns the results as a dict of
+    columns."""
+    columns = {key: [] for key in ['run'] + sorted(defaults) + stats}
+    if workers == 0:
+        results = map(run_config, configs)
+    else:
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(run_config, configs)
+    for i, (params, rows) in enumerate(zip(configs, results)):
+        for row in rows:
+            columns['run'].append(i)
+            for key in defaults:
+                columns[key].append(params[key])
+            for key, value in zip(stats, row):
+                columns[key].append(value)
+        report('run {:<4} best {:<8} after {} generations'.format(i, rows[-1][1], len(rows)))
+    if workers != 0:
+        pool.shutdown()
+    return {key: np.array(values) for key, values in columns.items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evolve bliques headless over a grid of parameters')
+    parser.add_argument('--config', default='config.ini', help='config file with the sizes and the #Sweep section')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUES',
+                        help='sweep NAME over comma separated VALUES, overriding the config')
+    parser.add_argument('--generations', type=int, help='generations per run')
+    parser.add_argument('--repeats', type=int, default=1, help='runs of each configuration, with different seeds')
+    parser.add_argument('--workers', type=int, help='processes to run configurations on, 0 to run in this one')
+    parser.add_argument('--output', default='batch.npz', help='file to write the results to')
+    args = parser.parse_args()
+
+    config = read_config(args.config)
+    params = base_parameters(config)
+    if args.generations:
+        params['generations'] = args.generations
+    sweep = {k: v if isinstance(v, list) else [v] for k, v in config.get('sweep', {}).items()}
+    for setting in args.set:
+        name, _, values = setting.partition('=')
+        values = parse_value(values)
+        sweep[name.strip().lower()] = values if isinstance(values, list) else [values]
+    try:
+        configs = expand(params, sweep, args.repeats)
+    except ValueError as e:
+        parser.error(str(e))
+    print('{} runs of {} generations'.format(len(configs), params['generations']), file=sys.stderr)
+    np.savez_compressed(args.output, **run(configs, args.workers))
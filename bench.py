@@ -0,0 +1,189 @@
+"""Benchmarks for the genalg and simulation hot paths.
+
+    python bench.py                          run everything, print JSON results
+    python bench.py --output base.json       save results as a baseline
+    python bench.py --baseline base.json     fail if anything got slower than the baseline
+    python bench.py --filter simulate        only run benchmarks whose name contains 'simulate'
+
+Every result is the best time per call over several repeats, in seconds.
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+import genalg.alg as ga
+from genalg.biology import *
+from blique import Blique, Brain, Environment, FitnessCache
+from spatial import SpatialHash
+
+benchmarks = []
+
+def benchmark(name, **grid):
+    """Registers a setup function under NAME, to be run once for every combination of
+    the parameter values in GRID. The setup function returns the callable to time."""
+    def register(setup):
+        keys = sorted(grid)
+        for values in itertools.product(*[grid[k] for k in keys]):
+            benchmarks.append((name, dict(zip(keys, values)), setup))
+        return setup
+    return register
+
+def make_population(size, genome_length, height=40, width=120):
+    """Returns an Environment holding a fresh population of SIZE bliques"""
+    Blique.genome_length = genome_length
+    Blique.start = (width - Blique.width) // 2, (height - Blique.height) // 2
+    bliques = Population(size=size, member=Blique, initialize=True)
+    return Environment(height, width, bliques)
+
+@benchmark('genome.crossover', length=[75, 1000])
+def bench_crossover(length):
+    a, b = Genome(length), Genome(length)
+    return lambda: a.crossover(b, False)
+
+@benchmark('genome.mutate', length=[75, 1000])
+def bench_mutate(length):
+    genome = Genome(length)
+    def run():
+        genome.substitution(random.randrange(genome.length))
+        genome.mutate()
+    return run
+
+@benchmark('blique.read_genome', genome_length=[75, 300])
+def bench_read_genome(genome_length):
+    blique = make_population(1, genome_length).bliques.individuals[0]
+    return blique.read_genome
+
+@benchmark('brain.process')
+def bench_brain_process():
+    brain = Brain(1, 4, 5, init=True)
+    return lambda: brain.process(17)
+
+@benchmark('brain.lookup')
+def bench_brain_lookup():
+    brain = Brain(1, 4, 5, init=True)
+    brain.compile()
+    return lambda: brain.lookup(17)
+
+@benchmark('blique.look_ahead', grid=[(40, 120), (400, 1200)])
+def bench_look_ahead(grid):
+    blique = make_population(1, 75, *grid).bliques.individuals[0]
+    return blique.look_ahead
+
+@benchmark('blique.get_tiles_under')
+def bench_tiles_under():
+    blique = make_population(1, 75).bliques.individuals[0]
+    return blique.get_tiles_under
+
+@benchmark('blique.blocked')
+def bench_blocked():
+    blique = make_population(1, 75).bliques.individuals[0]
+    return blique.blocked
+
+@benchmark('spatial.nearest', items=[100, 10000])
+def bench_spatial_nearest(items):
+    index = SpatialHash(8)
+    for i in range(items):
+        index.insert(i, random.randrange(1200), random.randrange(400))
+    return lambda: index.nearest(random.randrange(1200), random.randrange(400), max_distance=20)
+
+@benchmark('population.tournament', size=[15, 1000])
+def bench_tournament(size):
+    pop = Population(size=size)
+    return lambda: pop.tournament(min(10, size))
+
+@benchmark('ga.step', size=[15, 1000], method=['tournament', 'roulette', 'rank'])
+def bench_step(size, method):
+    pop = Population(size=size)
+    return lambda: ga.step(pop, method=method)
+
+@benchmark('environment.simulate', size=[15, 200, 1000], genome_length=[75, 300],
+           grid=[(40, 120), (200, 600)], mode=['object', 'vectorized'])
+def bench_simulate(size, genome_length, grid, mode):
+    env = make_population(size, genome_length, *grid)
+    return lambda: env.simulate(vectorized=mode == 'vectorized')
+
+@benchmark('environment.generation', size=[200, 1000])
+def bench_generation(size):
+    env = make_population(size, 75)
+    def run():
+        env.simulate(vectorized=True)
+        env.evolve_pop()
+    return run
+
+def measure(fn, repeat=3, min_time=0.2):
+    """Returns the best time per call of FN over REPEAT runs of enough calls to take
+    about MIN_TIME seconds"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= max(2, min(10, int(min_time / max(elapsed, 1e-9))))
+    best = min([elapsed] + timer.repeat(repeat - 1, number))
+    return best / number
+
+def key(result):
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+def run(pattern='', repeat=3, min_time=0.2, seed=0):
+    """Runs every benchmark whose name contains PATTERN, returning the results"""
+    results = []
+    defaults = Blique.genome_length, Blique.start
+    for name, params, setup in benchmarks:
+        if pattern not in name:
+            continue
+        random.seed(seed)
+        fn = setup(**params)
+        results.append({'name': name, 'params': params, 'seconds': measure(fn, repeat, min_time)})
+        Blique.genome_length, Blique.start = defaults
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+def compare(report, baseline, threshold):
+    """Prints each result next to its baseline and returns the results that are more
+    than THRESHOLD times slower"""
+    before = {key(r): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old
+        flag = ' REGRESSION' if ratio > threshold else ''
+        print('{:<24} {:<60} {:>12.3e} {:>7.2f}x{}'.format(r['name'], json.dumps(r['params'], sort_keys=True), r['seconds'], ratio, flag), file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(r)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the blique simulator')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio counted as a regression')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds to spend per timing')
+    args = parser.parse_args()
+
+    report = run(args.filter, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print('{} benchmark(s) regressed'.format(len(regressions)), file=sys.stderr)
+            sys.exit(1)
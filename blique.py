@@ -1,15 +1,25 @@
 import genalg.alg as ga
+import genalg.checkpoint as ga_checkpoint
+from genalg.instrument import Instrument, phase
+from genalg.islands import evolve_islands
 from genalg.biology import *
+import argparse
+from collections import OrderedDict
+from functools import lru_cache
 import random
 import time
-import curses
 import math
+import numpy as np
+import maps
+from spatial import SpatialHash
+from trajectory import Recorder, Trajectories
 
 __author__ = 'Dillon Yao'
 VERSION, BUILD = 0, 2
 
 ANIMATION_SPEED = 0.05
 STEP = 5
+FPS = 20
 
 class Directions:
     NORTH = 0
@@ -19,73 +29,297 @@ class Directions:
     LEFT = 4
     RIGHT = 5
 
+NORTH, EAST, SOUTH, WEST = Directions.NORTH, Directions.EAST, Directions.SOUTH, Directions.WEST
+# Unit steps for each facing, indexed by direction
+DX = np.array([0, 1, 0, -1])
+DY = np.array([-1, 0, 1, 0])
+
+def distances_ahead(passable):
+    """Given a 2d boolean array PASSABLE, returns for every cell the number of steps
+    along its row, in the direction of increasing column, to the first impassable cell.
+    Everything past the last column counts as impassable."""
+    rows, n = passable.shape
+    cols = np.arange(n)
+    walls = np.where(passable, n, cols)
+    after = np.concatenate([walls[:, 1:], np.full((rows, 1), n)], axis=1)
+    next_wall = np.minimum.accumulate(after[:, ::-1], axis=1)[:, ::-1]
+    return next_wall - cols
+
+@lru_cache(maxsize=None)
+def blique_image(width, height):
+    """Returns the appearance of a WIDTH by HEIGHT blique, shared by every blique of
+    that size"""
+    image = ['+' + '-' * (width - 2) + '+']
+    for i in range(height - 2):
+        image.append('|' + ' ' * (width - 2) + '|')
+    image.append('+' + '-' * (width - 2) + '+')
+    return tuple(image)
+
+@lru_cache(maxsize=None)
+def ticks_to_death(age, max_age, age_step):
+    """Returns how many more steps a blique of AGE survives before dying of old age,
+    and its age when it dies, adding AGE_STEP one step at a time exactly as
+    Blique.step does so the result is bit for bit the same"""
+    ticks = 0
+    while not age > max_age:
+        age += age_step
+        ticks += 1
+    return ticks, age
+
 def sigmoid(x):
     return 1 / (1 + math.exp(-x))
 
-def addstr(stdscr, x, y, s, color=None):
-    try:
-        if color:
-            stdscr.addstr(y, x, s)
-        else:
-            stdscr.addstr(y, x, s)
-    except:
-        pass
-
-def main(stdscr):
+def main(stdscr, map_path=None):
+    import curses
+    from render import CursesRenderer, ThreadedRenderer
     Genome.deletion_rate = 0
     curses.start_color()
     if not curses.has_colors():
         raise Exception('NO COLOR')
     height, width = curses.LINES, curses.COLS
 
-    Blique.x = (3 * height - Blique.width) // 2
-    Blique.y = (height - Blique.height) // 2
+    Blique.start = (3 * height - Blique.width) // 2, (height - Blique.height) // 2
 
-    bliques = Population(size=15, member=Blique, initialize=True)
-    env = Environment(height, width, bliques)
+    view = CursesRenderer(ANIMATION_SPEED)
+    renderer = ThreadedRenderer(view, FPS)
+    if map_path:
+        env = Environment(None, None, [], grid=map_path, renderer=renderer)
+        Blique.start = env.find_start(Blique.width, Blique.height)
+        view.look_at(*Blique.start)
+        env.set_population(Population(size=15, member=Blique, initialize=True))
+    else:
+        bliques = Population(size=15, member=Blique, initialize=True)
+        env = Environment(height, width - renderer.infobox_width, bliques, renderer=renderer)
 
     while True:
-        if env.generation % STEP == 0:
-            env.update()
-            env.simulate(True)
-        else:
-            env.simulate(False)
+        # Every STEP generations the generation is recorded and replayed on the render
+        # thread, which does not hold up the evolution
+        record = env.generation % STEP == 0 and not renderer.replaying
+        env.simulate(vectorized=True, record=record)
+        if record:
+            renderer.replay(env.recording)
         env.evolve_pop()
 
+def recorded(path, generation=None):
+    """Returns the recorded champion of every generation in the recording at PATH, or
+    just GENERATION, every blique of it if they were all kept. Raises a ValueError if
+    nothing was recorded, or naming the recorded generations if GENERATION is not
+    one of them."""
+    recorder = Recorder.load(path)
+    if not recorder.champions:
+        raise ValueError('no generations were recorded to {}'.format(path))
+    if generation is None:
+        return list(recorder.champions.values())
+    if generation in recorder.generations:
+        return [recorder.generations[generation]]
+    if generation in recorder.champions:
+        return [recorder.champions[generation]]
+    raise ValueError('generation {} was not recorded to {}; recorded generations: {}'.format(
+        generation, path, ', '.join(map(str, recorder.champions))))
+
+def replay(stdscr, recordings, map_path=None):
+    """Replays RECORDINGS, a list of Trajectories, over the map at MAP_PATH or an
+    empty grid of the recorded size"""
+    from render import CursesRenderer
+    height, width = recordings[0].grid_shape
+    view = CursesRenderer(ANIMATION_SPEED)
+    Environment(height, width, [], grid=map_path, renderer=view)
+    for recording in recordings:
+        view.replay(recording)
+    stdscr.getch()
+
+def run_headless(generations=100, height=40, width=120, size=15, batched=False, vectorized=False, workers=0, cache=0,
+                 checkpoint=None, checkpoint_every=10, resume=None, profile=None, map_path=None, scenarios=0,
+                 scenario_maps=(), aggregate='mean', patience=None, record=None, food=0, steady=0,
+                 report=print):
+    """Evolves a population of SIZE bliques for GENERATIONS generations on a HEIGHT x WIDTH
+    grid without curses, reporting progress through REPORT. Simulation is spread over
+    WORKERS processes if WORKERS is nonzero, and up to CACHE outcomes are memoized.
+    Every CHECKPOINT_EVERY generations the evaluated population is saved to
+    CHECKPOINT; a run continues from the checkpoint at RESUME without simulating the
+    checkpointed generation again. A JSON line of per phase timings and counters is
+    written to the file object PROFILE each generation. If MAP_PATH is given the
+    bliques evolve on that map instead of an empty grid. If SCENARIOS is nonzero each
+    blique is scored over that many random starts on the grid and on each map in
+    SCENARIO_MAPS, its fitness being the AGGREGATE of its scores. The run stops early
+    once the best fitness has not improved for PATIENCE generations. If RECORD is given
+    the paths of every generation are recorded, without the cache or workers, and the
+    champions of each generation and the last generations are saved to RECORD; runs
+    with SCENARIOS cannot be recorded. If FOOD
+    is nonzero that much food is put on the grid and ForagingBliques evolve instead,
+    unrecorded.
+    If STEADY is nonzero the population evolves by steady state replacement, STEADY
+    offspring at a time taking the place of the least fit bliques so that only they are
+    simulated; SIZE // STEADY such steps count as a generation, and they cannot be
+    recorded. Returns the number of generations simulated per second."""
+    if record and steady:
+        raise ValueError('steady state runs cannot be recorded')
+    if record and scenarios:
+        raise ValueError('runs scored over scenarios cannot be recorded')
+    if record and food:
+        raise ValueError('foraging runs cannot be recorded')
+    Genome.deletion_rate = 0
+    env = Environment(height, width, [], grid=map_path, cache=FitnessCache(cache) if cache else None,
+                      instrument=Instrument(stream=profile) if profile else None)
+    Blique.start = env.find_start(Blique.width, Blique.height)
+    member = ForagingBlique if food else Blique
+    if food:
+        env.place_food(food)
+    if scenarios:
+        others = [Environment(None, None, [], grid=path) for path in scenario_maps]
+        for other in others:
+            other.scenarios = other.random_scenarios(scenarios, Blique.width, Blique.height)
+        env.set_scenarios(env.random_scenarios(scenarios, Blique.width, Blique.height), others, aggregate)
+
+    if resume:
+        saved = ga_checkpoint.load(resume)
+        bliques = saved.population(member)
+        bliques.size = size
+    else:
+        bliques = Population(size=size, member=member, initialize=True)
+    env.set_population(bliques)
+    if resume:
+        env.generation = saved.generation
+        saved.restore_rng()
+        if not steady:
+            env.evolve_pop(saved.fitness)
+    evaluator = None
+    if workers:
+        from parallel import ParallelEvaluator
+        evaluator = ParallelEvaluator(env, workers)
+    if steady:
+        def evaluate(offspring):
+            env.simulate(batched=batched, vectorized=vectorized, evaluator=evaluator, bliques=offspring)
+        evolution = ga.SteadyState(env.bliques, saved.fitness if resume else None, steady, evaluate=evaluate,
+                                   instrument=env.instrument)
+
+    if record:
+        env.recorder = Recorder()
+    plateau = ga.Plateau(patience) if patience else None
+    generation = 0
+    start = time.perf_counter()
+    for generation in range(1, generations + 1):
+        if steady:
+            env.evolve_steady(evolution, max(1, size // steady))
+            best = evolution.best()
+            if checkpoint and env.generation % checkpoint_every == 0:
+                ga_checkpoint.save(checkpoint, env.bliques, env.generation, evolution.fitness)
+        else:
+            env.simulate(batched=batched, vectorized=vectorized, evaluator=evaluator, record=bool(record))
+            best = env.bliques.get_fittest().fitness()
+            if checkpoint and (env.generation + 1) % checkpoint_every == 0:
+                ga_checkpoint.save(checkpoint, env.bliques, env.generation)
+            env.evolve_pop()
+        elapsed = time.perf_counter() - start
+        report('generation {:<6} best {:<6} {:.2f} gen/s'.format(env.generation, best, generation / elapsed))
+        if plateau and plateau.update(best):
+            report('stopping, no improvement for {} generations'.format(patience))
+            break
+    rate = generation / (time.perf_counter() - start)
+    if record:
+        env.recorder.save(record)
+    if evaluator:
+        evaluator.close()
+    if env.cache is not None:
+        report('fitness cache: {} hits, {} misses'.format(env.cache.hits, env.cache.misses))
+    return rate
+
+def run_islands(islands=4, generations=100, height=40, width=120, size=15, interval=10, migrants=2, report=print):
+    """Evolves ISLANDS populations of SIZE bliques in separate processes with periodic
+    migration, reporting the best fitness of each island through REPORT. Returns the
+    number of generations simulated per second across all islands."""
+    Genome.deletion_rate = 0
+    start = time.perf_counter()
+    results = evolve_islands(Blique, islands, size, generations, interval, migrants,
+                                evaluate=HeadlessSimulation(height, width))
+    rate = islands * generations / (time.perf_counter() - start)
+    report('best per island: {}'.format(', '.join(str(pop[0][1]) for pop in results)))
+    return rate
+
+class HeadlessSimulation:
+    """A picklable evaluation hook that simulates a population on an empty HEIGHT x WIDTH
+    grid, starting every blique at its centre, for running bliques in other processes
+    such as genalg islands"""
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.start = ((width - Blique.width) // 2, (height - Blique.height) // 2)
+        self.env = None
+
+    def __call__(self, pop):
+        if self.env is None:
+            Genome.deletion_rate = 0
+            self.env = Environment(self.height, self.width, [])
+        self.env.bliques = pop
+        for blique in pop:
+            blique.env = self.env
+            blique.set_start(self.start)
+        self.env.simulate(vectorized=True)
+
 class Blique(Individual):
     """Creates a creature who dies upon touching a wall"""
     genome_length = 75
     max_move_distance = 3
     max_age = 30
     height, width = 3, 5
-    x, y = 1, 1
+    start = 1, 1
+    fast_forward = True
+    compiled = True
+    # Number of brain inputs. Bliques are independent when a blique's simulation
+    # depends on nothing but its own genome and start, so that it can be cached,
+    # vectorized or run in another process.
+    senses = 1
+    independent = True
     name_phenomes = [x + y for x in 'abcdefghijklmnoprstuvwxyz' for y in 'aeiouy']
+    # Names are drawn from their own generator so that when, or whether, a name is
+    # generated has no effect on the evolution
+    name_random = random.Random()
+
+    __slots__ = ('parents', '_name', 'env', 'brain', 'x', 'y', 'eye_x', 'eye_y', 'facing', 'alive', 'age',
+                 'distance_traveled', 'initial_state', 'seen', 'history', 'score')
 
     def __init__(self, parents=None, genome=None, coord=None):
         super().__init__(genome)
         self.parents = parents
-        self.name = self.gen_name()
-        if coord:
-            self.x, self.y = coord
+        self._name = None
+        self.env = None
+        self.score = None
+        self.x, self.y = coord or self.start
         self.alive = True
         self.age = 0
         self.distance_traveled = 0
         self.facing = random.randint(0, 3)
         self.set_eye()
-        self.set_image()
         self.initial_state = self.state()
+        self.reset()
+
+    @property
+    def name(self):
+        """The blique's name, only generated once it is first asked for"""
+        if self._name is None:
+            self._name = self.gen_name()
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
+    @property
+    def image(self):
+        """The blique's appearance when rendered"""
+        return blique_image(self.width, self.height)
 
     def gen_name(self):
         """Generates a name for the Blique based on either the parents name, or if it
         has no parents, creates a random one from the available phenomes"""
         name = ''
         if not self.parents:
-            length = random.randint(2, 4)
+            length = self.name_random.randint(2, 4)
             for i in range(length):
-                name += random.choice(self.name_phenomes)
+                name += self.name_random.choice(self.name_phenomes)
         else:
             p1, p2 = self.parents
-            cut = random.randint(1, 2)
+            cut = self.name_random.randint(1, 2)
             name += p1[:cut*2]
             name += p2[cut*2:]
         return name.capitalize()
@@ -105,39 +339,17 @@ class Blique(Individual):
             self.eye_x = self.x
             self.eye_y = self.y + self.height // 2
 
-    def set_image(self):
-        """sets the blique's appearance when rendered"""
-        self.image = ['+' + '-' * (self.width - 2) + '+']
-        for i in range(self.height - 2):
-            self.image.append('|' + ' ' * (self.width - 2) + '|')
-        self.image.append('+' + '-' * (self.width - 2) + '+')
-
     def mate(self, other, mutation):
         """Returns a new Blique with a genome crossed with that of another Blique"""
         crossed_genome = Genome.crossover(self.genome, other.genome, mutation)
-        child = Blique(genome=crossed_genome, parents=(self.name, other.name))
+        child = self.__class__(genome=crossed_genome, parents=(self.name, other.name))
         return child
 
     def look_ahead(self):
         """Blique finds distance form eye to wall"""
         if not self.env:
             raise Exception('Blique not in an environemnt')
-        if self.facing == NORTH:
-            dx, dy = 0, -1
-        elif self.facing == EAST:
-            dx, dy = 1, 0
-        elif self.facing == SOUTH:
-            dx, dy = 0, 1
-        elif self.facing == WEST:
-            dx, dy = -1, 0
-        x, y = self.eye_x + dx, self.eye_y + dy
-        tile = self.env.get_tile(x, y)
-        dist = 1
-        while tile.passable:
-            x, y = x + dx, y + dy
-            tile = self.env.get_tile(x, y)
-            dist += 1
-        return dist
+        return self.env.look_ahead(self.eye_x, self.eye_y, self.facing)
 
     def move(self, amt=1):
         """Moves the Blique in the direction that it is facing by AMT tiles"""
@@ -159,7 +371,13 @@ class Blique(Individual):
     def get_next_move(self, *inp):
         """Takes the input of the blique and processes through the Bliques brain, using the
         inputs from INP"""
-        turn, turn_dir, m1, m2 = self.brain.process(*inp)
+        if self.brain.table is not None:
+            return self.next_move(self.brain.lookup(*inp))
+        return self.next_move(self.brain.process(*inp))
+
+    def next_move(self, output):
+        """Returns the move encoded by OUTPUT, the rounded outputs of the Bliques brain"""
+        turn, turn_dir, m1, m2 = output
         if turn:
             return lambda: self.turn(1 if turn_dir else -1)
         else:
@@ -171,31 +389,85 @@ class Blique(Individual):
             raise Exception('Blique is not in an Environment')
         return [self.env.get_tile(self.x + dx, self.y + dy) for dx in range(self.width) for dy in range(self.height)]
 
+    def blocked(self):
+        """Returns whether any tile under the blique is impassable"""
+        if not self.env:
+            raise Exception('Blique is not in an Environment')
+        return self.env.blocked(self.x, self.y, self.width, self.height)
+
     def simulate(self):
         """Continues to call STEP until the blique is dead"""
         while self.alive:
             self.step()
 
-    def step(self):
+    def step(self, output=None, fast_forward=True):
         """The blique will find how far it is to the nearest wall and take a move based
-        on that output"""
-        distance_to_obstacle = self.look_ahead()
-        next_move = self.get_next_move(distance_to_obstacle)
+        on that output. OUTPUT, if given, is the brain's already computed response to
+        the current look_ahead distance. FAST_FORWARD=False keeps the blique stepping
+        through cycles so every move can be drawn"""
+        if output is None:
+            next_move = self.get_next_move(self.look_ahead())
+        else:
+            next_move = self.next_move(output)
         next_move()
         self.set_eye()
-        if self.age > self.max_age or any(not tile.passable for tile in self.get_tiles_under()):
+        if self.age > self.max_age or self.blocked():
             self.alive = False
         if self.alive:
             self.age += ANIMATION_SPEED * 4
+            if self.fast_forward and fast_forward:
+                self.detect_cycle()
+
+    def detect_cycle(self):
+        """A blique's next move depends only on its position and facing, so once that
+        state repeats the blique will loop through the same states until it dies of old
+        age. When the current state has been seen before, the blique jumps straight to
+        the state, distance and age it would die with."""
+        state = self.x, self.y, self.facing
+        now = len(self.history)
+        start = self.seen.get(state)
+        if start is None:
+            self.seen[state] = now
+            self.history.append(state + (self.distance_traveled,))
+            return
+        length = now - start
+        gain = self.distance_traveled - self.history[start][3]
+        ticks, self.age = ticks_to_death(self.age, self.max_age, ANIMATION_SPEED * 4)
+        # The move of the step that kills the blique still happens
+        cycles, offset = divmod(now + ticks + 1 - start, length)
+        self.x, self.y, self.facing, distance = self.history[start + offset]
+        self.distance_traveled = distance + cycles * gain
+        self.alive = False
+        self.set_eye()
+
+    @classmethod
+    def conv_size(cls, genome_length=None):
+        """Returns the number of convolution nodes a genome of GENOME_LENGTH bits, by
+        default the class's, has genes for. Each node takes a gene for every sense and
+        one for each of the 4 outputs."""
+        length = cls.genome_length if genome_length is None else genome_length
+        return length // 3 // (cls.senses + 4)
 
     def read_genome(self):
-        """Creates a Brain instance (a neural network) with a single input and 5 outputs
-        and a single convolution layer with 4 nodes. Weights are determined by genes
-        of length 4 in the input subsequence"""
-        self.brain = Brain(1, 4, 5)
-        genes = [self.read_gene(self.genome.subsequence(i, i+3)) for i in range(0, self.genome_length, 3)]
-        self.brain.set_layer1_weights([genes[:5]])
-        self.brain.set_layer2_weights([genes[5:9], genes[9:13], genes[13:17], genes[17:21], genes[21:25]])
+        """Creates a Brain instance (a neural network) with one input per sense and 4
+        outputs and a single convolution layer with as many nodes as the class's
+        genome_length has genes for, 5 by default. Weights are determined by genes of
+        length 3 in the input subsequence"""
+        size = self.conv_size()
+        self.brain = Brain(self.senses, 4, size)
+        genome = self.genome
+        genes = [self.gene_value(genome.slice_bits(i, i+3), min(3, genome.length - i)) for i in range(0, genome.length, 3)]
+        n = size * self.senses
+        self.brain.set_layer1_weights([genes[i:i+size] for i in range(0, n, size)])
+        self.brain.set_layer2_weights([genes[i:i+4] for i in range(n, n + 4 * size, 4)])
+        if self.compiled and self.senses == 1:
+            self.brain.compile()
+
+    @staticmethod
+    def gene_value(bits, size):
+        """Returns the same value as read_gene for a gene of SIZE bits packed into BITS"""
+        weight = (1 << (size - 1)) | (bits >> 1)
+        return -weight if bits & 1 else weight
 
     def read_gene(self, gene):
         """Returns the binary value of the gene read using a sign bit"""
@@ -208,18 +480,29 @@ class Blique(Individual):
         return weight
 
     def fitness(self):
-        """Returns the fitness of the current Blique"""
+        """Returns the fitness of the current Blique, or its score over the
+        Environment's scenarios when it has been scored over them"""
+        if self.score is not None:
+            return self.score
         return int(self.distance_traveled * 5 + self.age)
 
     def load_state(self, state):
         """Set the current blique's state to STATE"""
-        self.alive, self.age, self.distance_traveled, _, coord = state
+        self.alive, self.age, self.distance_traveled, _, coord, self.facing = state
         self.x, self.y = coord
         self.set_eye()
 
+    def set_start(self, coord):
+        """Moves the blique's initial position to COORD"""
+        alive, age, distance_traveled, fitness, _, facing = self.initial_state
+        self.initial_state = alive, age, distance_traveled, fitness, coord, facing
+
     def reset(self):
         """Revert's the blique to its initial state"""
         self.load_state(self.initial_state)
+        self.score = None
+        self.seen = {(self.x, self.y, self.facing): 0}
+        self.history = [(self.x, self.y, self.facing, self.distance_traveled)]
 
     def bio(self):
         """Returns identification info on the blique"""
@@ -227,130 +510,479 @@ class Blique(Individual):
 
     def state(self):
         """Returns a tuple representing the blique's state"""
-        return self.alive, self.age, self.distance_traveled, self.fitness(), (self.x, self.y)
+        return self.alive, self.age, self.distance_traveled, self.fitness(), (self.x, self.y), self.facing
+
+class ForagingBlique(Blique):
+    """A blique that also senses the nearest food and the nearest other blique from
+    its eye, and gains FOOD_ENERGY of life and FOOD_VALUE of fitness for each food
+    it eats. Its brain's inputs are the look_ahead distance and the distances to the
+    nearest food and blique, which read as SENSE_RANGE when nothing is in range.
+    Living ForagingBliques are kept in the Environment's neighbours index."""
+    genome_length = 105
+    senses = 3
+    independent = False
+    fast_forward = False
+    sense_range = 20
+    food_energy = 5
+    food_value = 50
+
+    __slots__ = ('eaten',)
+
+    def __init__(self, parents=None, genome=None, coord=None):
+        self.eaten = 0
+        super().__init__(parents, genome, coord)
+
+    def center(self):
+        """Returns the tile at the centre of the blique"""
+        return self.x + self.width // 2, self.y + self.height // 2
+
+    def sense(self):
+        """Returns the inputs to the blique's brain"""
+        env, reach = self.env, self.sense_range
+        _, food = env.food.nearest(self.eye_x, self.eye_y, max_distance=reach)
+        _, neighbour = env.neighbours.nearest(self.eye_x, self.eye_y, exclude=self, max_distance=reach)
+        return self.look_ahead(), reach if food is None else food, reach if neighbour is None else neighbour
+
+    def step(self, output=None, fast_forward=True):
+        """Takes a step as a Blique does on what the blique senses, then eats any food
+        under it and moves in, or out of, the neighbours index"""
+        if output is None:
+            output = self.brain.process(*self.sense())
+        super().step(output, False)
+        neighbours = self.env.neighbours
+        if self.alive:
+            eaten = self.env.eat(self.x, self.y, self.width, self.height)
+            self.eaten += eaten
+            self.age -= eaten * self.food_energy
+            neighbours.move(self, *self.center())
+        elif self in neighbours:
+            neighbours.remove(self)
+
+    def fitness(self):
+        """Returns the fitness of a Blique plus the value of the food eaten"""
+        if self.score is not None:
+            return self.score
+        return super().fitness() + self.eaten * self.food_value
+
+    def reset(self):
+        """Reverts the blique to its initial state, back in the neighbours index"""
+        self.eaten = 0
+        super().reset()
+        if self.env is not None:
+            self.env.neighbours.insert(self, *self.center())
 
 class Environment:
-    """Handles the display, animation, and evolution of a population of bliques"""
-    infobox_width = 35
+    """Runs and evolves a population of bliques on a grid. Drawing is delegated to an
+    optional RENDERER, so an Environment without one never touches curses."""
     title = 'Blique Evolution Sim v {}.{}'.format(VERSION, BUILD)
+    chunk = 1 << 22
+    aggregates = {'mean': np.mean, 'min': np.min}
+    cell_size = 8
 
-    def __init__(self, height, width, bliques, grid=None):
-        """TODO: add support for input file grids"""
+    def __init__(self, height, width, bliques, grid=None, renderer=None, cache=None, instrument=None):
+        """GRID may be an array of tile codes, a flat list of Tiles or the path of a map
+        file. A map file is memory mapped copy on write, so its pages are shared
+        until tiles change and the file itself is never written, and HEIGHT and
+        WIDTH may be None to take them from the map."""
+        self.map_path = None
+        if isinstance(grid, str):
+            self.map_path = grid
+            grid = maps.open_grid(grid, 'c')
+            height, width = grid.shape
         self.width = width
         self.height = height
         self.generation = 0
         self.view_height = height
-        self.view_width = width - self.infobox_width
-        self.grid = grid or self.make_grid()
-        self.initialize_windows()
+        self.view_width = width
+        self.grid = self.make_grid() if grid is None else self.load_grid(grid)
+        self.grid_version = 0
+        self.build_distances()
         self.bliques = bliques
         for blique in self.bliques:
             blique.env = self
-
-    def initialize_windows(self):
-        """initializes the viewbox and infobox for the Environment"""
-        self.viewbox = curses.newwin(self.view_height, self.view_width, 0, 0)
-        self.infobox = curses.newwin(self.view_height, self.infobox_width, 0, self.view_width)
-        self.init_infobox()
-
-    def init_infobox(self):
-        """initializes the column headers for the infobox"""
-        self.infobox.border()
-        header = '{:<2} {:<5} {:<10} {:<3} {:<5}'.format('#', 'F', 'Name', 'Age', 'Distance')
-        delimeter = '-  -     ----       --- --------'
-        addstr(self.infobox, 1, 1, header)
-        addstr(self.infobox, 1, 2, delimeter)
-        self.infobox.refresh()
+        self.cache = cache
+        self.instrument = instrument
+        self.scenarios = None
+        self.scenario_maps = []
+        self.aggregate = 'mean'
+        self.recorder = None
+        self.recording = None
+        self._food = None
+        self.food_supply = None
+        self.neighbours = SpatialHash(self.cell_size)
+        self.renderer = renderer
+        if renderer:
+            renderer.attach(self)
 
     def make_grid(self):
-        """Generates an empty grid of all Tiles"""
-        grid = [Tile() for _ in range(self.view_width * self.view_height)]
-        return grid
+        """Generates an empty grid of all Tiles. The grid is an array of tile codes
+        indexed by [y, x]; TILES maps each code to its shared Tile."""
+        return np.full((self.view_height, self.view_width), int(TILES[1]), dtype=np.uint8)
+
+    def load_grid(self, grid):
+        """Converts GRID, either an array of tile codes or a flat row-major list of
+        Tiles, into the Environment's grid of tile codes"""
+        if isinstance(grid, np.ndarray):
+            return grid.reshape(self.view_height, self.view_width)
+        codes = np.array([int(tile) for tile in grid], dtype=np.uint8)
+        return codes.reshape(self.view_height, self.view_width)
+
+    def tile(self, x, y):
+        """Returns the Tile stored at (x, y), without the border walls of get_tile"""
+        return TILES[self.grid[y, x]]
 
     def get_tile(self, x, y):
         """Retrieves the Tile at coordinates (x, y) on the grid"""
         if x <= 0 or x >= self.view_width:
-            return Wall()
+            return WALL
         if y <= 0 or y >= self.view_height:
-            return Wall()
-        return self.grid[y * self.view_width + x]
+            return WALL
+        return TILES[self.grid[y, x]]
+
+    def set_tile(self, x, y, tile):
+        """Replaces the Tile at coordinates (x, y) with TILE, updating the distance
+        tables for the row and column it lies on, the collision table and the food
+        index"""
+        was_food = self.grid[y, x] == int(FOOD)
+        self.grid[y, x] = int(tile)
+        if was_food != (int(tile) == int(FOOD)):
+            self.grid_version += 1
+            if self._food is not None:
+                if was_food:
+                    self._food.remove((x, y))
+                else:
+                    self._food.insert((x, y), x, y)
+        if x <= 0 or y <= 0 or self.mask[y, x] == tile.passable:
+            return
+        if self.padded is None:
+            self.padded = np.zeros((self.view_height + 2, self.view_width + 2), dtype=bool)
+            self.padded[1:-1, 1:-1] = self.mask
+        self.mask[y, x] = tile.passable
+        self.grid_version += 1
+        self.walls[y+1:, x+1:] += -1 if tile.passable else 1
+        padded, px, py = self.padded, x + 1, y + 1
+        padded[py, px] = tile.passable
+        row, col = padded[py:py+1], padded[:, px:px+1]
+        self.distances[EAST, py] = distances_ahead(row)[0]
+        self.distances[WEST, py] = distances_ahead(row[:, ::-1])[0, ::-1]
+        self.distances[SOUTH, :, px] = distances_ahead(col.T)[0]
+        self.distances[NORTH, :, px] = distances_ahead(col[::-1].T)[0, ::-1]
+
+    def build_distances(self):
+        """Precomputes, for every cell and facing, the distance look_ahead would measure
+        from that cell. The tables are padded by one cell on each side since an eye
+        can sit just outside the grid; further out every distance is 1. Also builds
+        WALLS, a summed area table of impassable tiles used for collision. Tables
+        precomputed for a map file are memory mapped copy on write instead. Large
+        grids are processed in blocks of about CHUNK cells to bound temporary
+        memory."""
+        tables = maps.load_tables(self.map_path, 'c') if self.map_path else None
+        if tables:
+            self.mask, self.walls, self.distances = tables
+            self.padded = None
+            return
+        self.mask = self.passable_mask()
+        height, width = self.mask.shape
+        dtype = np.int64 if self.mask.size >= 2 ** 31 else np.int32
+        walls = np.zeros((height + 1, width + 1), dtype=dtype)
+        walls[1:, 1:] = (~self.mask).cumsum(0, dtype=dtype).cumsum(1, dtype=dtype)
+        self.walls = walls
+        padded = self.padded = np.zeros((height + 2, width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = self.mask
+        dtype = np.uint16 if max(height, width) + 2 < 2 ** 16 else np.int32
+        self.distances = np.empty((4,) + padded.shape, dtype=dtype)
+        rows = max(1, self.chunk // padded.shape[1])
+        for r in range(0, padded.shape[0], rows):
+            block = padded[r:r+rows]
+            self.distances[EAST, r:r+rows] = distances_ahead(block)
+            self.distances[WEST, r:r+rows] = distances_ahead(block[:, ::-1])[:, ::-1]
+        cols = max(1, self.chunk // padded.shape[0])
+        for c in range(0, padded.shape[1], cols):
+            block = padded[:, c:c+cols]
+            self.distances[SOUTH, :, c:c+cols] = distances_ahead(block.T).T
+            self.distances[NORTH, :, c:c+cols] = distances_ahead(block[::-1].T).T[::-1]
+
+    def look_ahead(self, x, y, facing):
+        """Returns the distance from (x, y) to the first impassable tile in the direction
+        FACING by table lookup. Accepts scalars or equally shaped integer arrays."""
+        px, py = x + 1, y + 1
+        _, height, width = self.distances.shape
+        if np.ndim(px) == 0:
+            if 0 <= px < width and 0 <= py < height:
+                return int(self.distances[facing, py, px])
+            return 1
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        dist = np.ones(px.shape, dtype=int)
+        dist[inside] = self.distances[facing[inside], py[inside], px[inside]]
+        return dist
+
+    def blocked(self, x, y, width, height):
+        """Returns whether the WIDTH x HEIGHT rectangle with top left corner (x, y)
+        covers any impassable tile, in constant time. Accepts scalars or equally shaped
+        integer arrays for X and Y."""
+        grid_height, grid_width = self.mask.shape
+        walls = self.walls
+        if np.ndim(x) == 0:
+            if x < 0 or y < 0 or x + width > grid_width or y + height > grid_height:
+                return True
+            return bool(walls[y + height, x + width] - walls[y, x + width] - walls[y + height, x] + walls[y, x])
+        outside = (x < 0) | (y < 0) | (x + width > grid_width) | (y + height > grid_height)
+        x, y = np.where(outside, 0, x), np.where(outside, 0, y)
+        count = walls[y + height, x + width] - walls[y, x + width] - walls[y + height, x] + walls[y, x]
+        return outside | (count > 0)
+
+    def find_start(self, width, height):
+        """Returns the top left corner of the free WIDTH x HEIGHT rectangle nearest the
+        centre of the grid, searching rows outward from the centre row"""
+        cx = (self.view_width - width) // 2
+        cy = (self.view_height - height) // 2
+        xs = np.arange(self.view_width)
+        for dy in range(self.view_height):
+            for y in {cy + dy, cy - dy}:
+                if 0 <= y < self.view_height:
+                    free = np.flatnonzero(~self.blocked(xs, np.full_like(xs, y), width, height))
+                    if len(free):
+                        return int(free[np.abs(free - cx).argmin()]), y
+        raise ValueError('No room for a {}x{} blique'.format(width, height))
+
+    @property
+    def food(self):
+        """A SpatialHash of the food tiles, keyed by their (x, y). Built from the grid
+        the first time it is used and kept up to date by set_tile after."""
+        if self._food is None:
+            self._food = SpatialHash(self.cell_size)
+            for y, x in np.argwhere(self.grid == int(FOOD)).tolist():
+                self._food.insert((x, y), x, y)
+        return self._food
+
+    def place_food(self, count, seed=0):
+        """Puts food on COUNT empty tiles drawn with SEED. The same food is put back at
+        the start of every generation."""
+        rng = np.random.default_rng(seed)
+        empty = np.argwhere(self.grid[1:, 1:] == int(TILES[1])) + 1
+        chosen = empty[rng.choice(len(empty), min(count, len(empty)), replace=False)]
+        self.food_supply = [(x, y) for y, x in chosen.tolist()]
+        self.restock()
+
+    def restock(self):
+        """Puts back any of the food supply that has been eaten"""
+        for x, y in self.food_supply:
+            if (x, y) not in self.food:
+                self.set_tile(x, y, FOOD)
+
+    def eat(self, x, y, width, height):
+        """Removes the food under the WIDTH x HEIGHT rectangle with top left corner
+        (x, y), returning how much there was"""
+        eaten = self.food.within(x, y, width, height)
+        for fx, fy in eaten:
+            self.set_tile(fx, fy, TILES[1])
+        return len(eaten)
+
+    def random_scenarios(self, count, width, height, seed=0):
+        """Returns COUNT scenarios drawn with SEED as an array of (x, y, facing) rows,
+        each a start where a WIDTH x HEIGHT blique is not blocked"""
+        rng = np.random.default_rng(seed)
+        found = np.empty((0, 2), dtype=int)
+        for _ in range(100):
+            x = rng.integers(0, self.view_width - width + 1, 8 * count)
+            y = rng.integers(0, self.view_height - height + 1, 8 * count)
+            free = ~self.blocked(x, y, width, height)
+            found = np.concatenate([found, np.column_stack([x[free], y[free]])])
+            if len(found) >= count:
+                facing = rng.integers(0, 4, count)
+                return np.column_stack([found[:count], facing])
+        raise ValueError('No room for {} {}x{} bliques'.format(count, width, height))
+
+    def set_scenarios(self, scenarios, maps=(), aggregate='mean'):
+        """Scores every blique over SCENARIOS, an array of (x, y, facing) rows, instead
+        of its own start. MAPS holds other Environments, each with its own scenarios
+        set, that the bliques are scored on as well. A blique's fitness is the
+        AGGREGATE, 'mean' or 'min', of its fitness in every scenario."""
+        self.scenarios = np.asarray(scenarios)
+        self.scenario_maps = list(maps)
+        self.aggregate = aggregate
+
+    def set_population(self, bliques):
+        """Replaces the population with BLIQUES"""
+        self.bliques = bliques
+        for blique in self.bliques:
+            blique.env = self
 
     def add_blique(self, blique):
         """Add a new blique to the population"""
         self.bliques.add_individual(blique)
         blique.env = self
 
-    def add_blique_to_viewbox(self, blique, color=None):
-        """Draws a blique b at the coordinates (b.x, b.y)"""
-        y = blique.y
-        for line in blique.image:
-            addstr(self.viewbox, blique.x, y, line)
-            y += 1
-        addstr(self.viewbox, blique.eye_x, blique.eye_y, 'O')
-        addstr(self.viewbox, blique.x, blique.y + blique.height, blique.name)
-
-    def undraw_blique(self, blique):
-        """Removes the blique b from it's coordinates"""
-        for dy in range(blique.height):
-            for dx in range(blique.width):
-                x, y = blique.x + dx, blique.y + dy
-                if y * self.view_width + x < len(self.grid):
-                    char = str(self.grid[y * self.view_width + x])
-                    addstr(self.viewbox, x, y, char)
-        addstr(self.viewbox, blique.x, blique.y + blique.height, ' ' * len(blique.name))
-        self.viewbox.refresh()
-
-    def update_info(self):
-        """Updates the infobox with the bliques currently in the population, sorted by
-        their fitness values"""
-        offset = 3
-        sorted_bliques = sorted(self.bliques, key=lambda b: b.fitness(), reverse=True)
-        addstr(self.infobox, 1, 0, 'Generation: {}'.format(self.generation))
-        for i, blique in enumerate(sorted_bliques):
-            row = i + offset
-            info = '{:<2} {:<5} {:<10} {:<3} {:<4}'.format(i+1, blique.fitness(), blique.name, int(blique.age), int(blique.distance_traveled))
-            addstr(self.infobox, 1, row, info)
-        self.infobox.refresh()
-
-    def update(self, bliques=[]):
-        """Update the viewbox and infobox"""
-        self.viewbox.clear()
-        for x in range(self.view_width):
-            for y in range(self.view_height):
-                char = str(self.grid[y * self.view_width + x])
-                addstr(self.viewbox, x, y, char)
-        self.viewbox.border()
-        addstr(self.viewbox, 1, 0, self.title)
-        self.update_info()
-        for b in bliques:
-            self.add_blique_to_viewbox(b)
-        self.viewbox.refresh()
-
-    def simulate(self, animate=False):
-        """Simulate the bliques actions until all bliques are dead, drawing to the viewbox
-        if ANIMATE"""
-        for b in self.bliques:
-            b.reset()
-        to_draw = [b for b in self.bliques if b.alive]
-        if not animate:
-            self.update()
-            addstr(self.viewbox, (self.view_width - len('SIMULATING')) // 2, self.view_height // 2, 'SIMULATING')
-            self.viewbox.refresh()
-        while to_draw:
-            for b in to_draw:
-                b.step()
-                if not b.alive:
-                    to_draw.remove(b)
-            if animate:
-                self.update(to_draw)
-                time.sleep(ANIMATION_SPEED)
-            self.update_info()
-
-    def evolve_pop(self):
-        """Evolves the population by a generation"""
-        self.bliques = ga.step(self.bliques)
-        for blique in self.bliques:
-            blique.env = self
+    def passable_mask(self):
+        """Returns a boolean array indexed by [y, x] that is true where get_tile(x, y)
+        is passable"""
+        mask = PASSABLE[self.grid]
+        mask[0, :] = False
+        mask[:, 0] = False
+        return mask
+
+    def simulate(self, animate=False, batched=False, vectorized=False, evaluator=None, record=False, bliques=None):
+        """Simulate the bliques actions until all bliques are dead, handing every tick to
+        the renderer (if any) to be drawn when ANIMATE. If BATCHED, the brains of all
+        living bliques are evaluated together by a PopulationBrain each tick. If
+        VECTORIZED, the whole population is advanced at once as a PopulationState.
+        Unanimated generations are handed to EVALUATOR, such as a ParallelEvaluator,
+        when one is given. Bliques whose outcome is in the Environment's cache are not
+        simulated unless ANIMATE. Bliques that are not independent, such as
+        ForagingBliques, are always simulated as objects. Unanimated generations are
+        always vectorized, and never cached, when the Environment has scenarios.
+        Otherwise, if RECORD, the generation is vectorized without the cache or
+        EVALUATOR and the paths of the bliques are kept as the Environment's
+        recording, and added to its recorder. Only the given BLIQUES are simulated,
+        if any, rather than the population."""
+        with phase(self.instrument, 'simulate'):
+            if self.food_supply is not None:
+                self.restock()
+            if bliques is None:
+                bliques = list(self.bliques)
+            else:
+                bliques = list(bliques)
+                for b in bliques:
+                    b.env = self
+            if not bliques:
+                return
+            for b in bliques:
+                b.reset()
+            if not bliques[0].independent:
+                self.simulate_objects(bliques, animate)
+                return
+            if self.scenarios is not None and not animate:
+                self.simulate_scenarios(bliques)
+                return
+            if record and not animate:
+                self.recording = self.simulate_vectorized(bliques, record=True)
+                if self.recorder is not None:
+                    self.recorder.add(self.recording)
+                return
+            if self.cache is not None and not animate:
+                total = len(bliques)
+                bliques, keys = self.cache.restore(bliques, self.grid_version)
+                if self.instrument:
+                    self.instrument.count('cached', total - len(bliques))
+            if evaluator and not animate:
+                evaluator.evaluate(bliques)
+            elif vectorized:
+                self.simulate_vectorized(bliques, animate)
+            else:
+                self.simulate_objects(bliques, animate, batched)
+            if self.cache is not None and not animate:
+                self.cache.store(bliques, keys)
+
+    def count_tick(self, alive):
+        """Counts a tick of ALIVE bliques, each looking up tiles for its look_ahead and
+        its collision check. Brain evaluations are counted by the brains, since most
+        ticks only look up an output already computed."""
+        self.instrument.count('ticks')
+        self.instrument.count('tile_lookups', 2 * alive)
+
+    def render(self, method, *args):
+        """Calls METHOD of the renderer with ARGS, timed as the 'render' phase"""
+        with phase(self.instrument, 'render'):
+            getattr(self.renderer, method)(*args)
+
+    def simulate_objects(self, bliques, animate=False, batched=False):
+        """Simulate BLIQUES by stepping each blique object in turn"""
+        alive = [b for b in bliques if b.alive]
+        if batched:
+            brains = PopulationBrain([b.brain for b in alive])
+            rows = np.arange(len(alive))
+        if self.instrument:
+            evaluations = sum(b.brain.evaluations for b in bliques)
+        if self.renderer:
+            self.render('begin', animate)
+        while alive:
+            if self.instrument:
+                self.count_tick(len(alive))
+            if batched:
+                distances = [b.look_ahead() for b in alive]
+                outputs = brains.lookup(distances, rows).tolist()
+                for b, output in zip(alive, outputs):
+                    b.step(output, not animate)
+                rows = rows[[b.alive for b in alive]]
+            else:
+                for b in alive:
+                    b.step(fast_forward=not animate)
+            alive = [b for b in alive if b.alive]
+            if self.renderer and self.renderer.due():
+                self.render('frame', alive, animate)
+        if self.instrument:
+            evaluations = sum(b.brain.evaluations for b in bliques) - evaluations
+            self.instrument.count('brain_evaluations', evaluations + (brains.evaluations if batched else 0))
+        if self.renderer:
+            self.render('end', animate)
+
+    def simulate_vectorized(self, bliques, animate=False, record=False):
+        """Simulate BLIQUES as a PopulationState, writing the final state back to each
+        blique. The bliques are only synced every tick when there is a renderer. If
+        RECORD, returns the Trajectories of the bliques."""
+        if not bliques:
+            return
+        state = PopulationState(self, bliques, not animate, record=record)
+        if self.renderer:
+            self.render('begin', animate)
+        while state.alive.any():
+            if self.instrument:
+                self.count_tick(np.count_nonzero(state.alive))
+            state.tick()
+            if self.renderer and self.renderer.due():
+                state.sync()
+                self.render('frame', [b for b in state.bliques if b.alive], animate)
+        state.sync()
+        if self.instrument:
+            self.instrument.count('brain_evaluations', state.brains.evaluations)
+        if self.renderer:
+            self.render('end', animate)
+        if record:
+            return state.trajectories(self.generation)
+
+    def simulate_scenarios(self, bliques):
+        """Scores BLIQUES over the scenarios of this Environment and of each of its
+        scenario maps. Every blique is started from every scenario of a map and the
+        whole grid of bliques and scenarios is advanced as one PopulationState. The
+        bliques are left in their final state of this Environment's first scenario."""
+        if not bliques:
+            return
+        brains = PopulationBrain([b.brain for b in bliques])
+        fitness = []
+        for env in [self] + self.scenario_maps:
+            state = PopulationState(env, bliques, scenarios=env.scenarios, brains=brains)
+            while state.alive.any():
+                if self.instrument:
+                    self.count_tick(np.count_nonzero(state.alive))
+                state.tick()
+            if env is self:
+                state.sync()
+            fitness.append(state.fitness().reshape(len(bliques), -1))
+        if self.instrument:
+            self.instrument.count('brain_evaluations', brains.evaluations)
+        scores = self.aggregates[self.aggregate](np.concatenate(fitness, axis=1), axis=1)
+        for b, score in zip(bliques, scores.tolist()):
+            b.score = score
+
+    def evolve_pop(self, fitness=None):
+        """Evolves the population by a generation, using the FITNESS of each blique if
+        it is already known. Ends the generation's instrumentation record"""
+        with phase(self.instrument, 'evolve'):
+            self.bliques = ga.step(self.bliques, fitness=fitness, instrument=self.instrument)
+            for blique in self.bliques:
+                blique.env = self
+        if self.instrument:
+            self.instrument.emit(generation=self.generation, population=len(self.bliques.individuals))
+        self.generation += 1
+
+    def evolve_steady(self, evolution, steps):
+        """Advances the ga.SteadyState EVOLUTION of the population by STEPS steps,
+        counted as one generation. Ends the generation's instrumentation record"""
+        with phase(self.instrument, 'evolve'):
+            for _ in range(steps):
+                evolution.step()
+        if self.instrument:
+            self.instrument.emit(generation=self.generation, population=len(self.bliques.individuals))
         self.generation += 1
 
     def str_rep(self):
@@ -358,16 +990,201 @@ class Environment:
         grid = ''
         for y in range(self.view_height):
             for x in range(self.view_width):
-                grid += str(self.grid[y * self.view_width + x])
+                grid += str(self.tile(x, y))
             grid += '\n'
         return grid
 
+class FitnessCache:
+    """A bounded least recently used cache of simulation outcomes. A blique's
+    simulation is deterministic given its genome, starting position and facing, and
+    the grid, so those make up the key; the value is the blique's final state."""
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(blique, grid_version):
+        """Returns the cache key for BLIQUE, which must be in its initial state"""
+        return blique.genome.bits, blique.genome.length, blique.x, blique.y, blique.facing, grid_version
+
+    def restore(self, bliques, grid_version):
+        """Loads the cached final state of each of BLIQUES found in the cache. Returns
+        the bliques that were not found, and their keys, to be simulated and stored"""
+        missed, keys = [], []
+        for b in bliques:
+            key = self.key(b, grid_version)
+            state = self.entries.get(key)
+            if state is None:
+                self.misses += 1
+                missed.append(b)
+                keys.append(key)
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                b.load_state(state)
+        return missed, keys
+
+    def store(self, bliques, keys):
+        """Caches the current state of each of BLIQUES as the outcome for its key"""
+        for b, key in zip(bliques, keys):
+            self.entries[key] = b.state()
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+class PopulationState:
+    """The state of a population of bliques held as a structure of arrays, one entry
+    per blique, so that a tick advances every living blique at once. All bliques must
+    share the same width and height. Produces the same states, and therefore fitness,
+    as calling Blique.step on each blique.
+
+    Given SCENARIOS, an array of (x, y, facing) rows, every blique instead starts
+    afresh from each scenario, with a row per blique and scenario ordered by blique.
+    BRAINS may be given as an already built PopulationBrain of BLIQUES.
+
+    If RECORD, the position and facing of every row is traced each tick, along with
+    how many ticks each row moved for and any cycle it was fast forwarded through,
+    for trajectories to encode."""
+    cycle_window = 8
+    def __init__(self, env, bliques, fast_forward=True, scenarios=None, brains=None, record=False):
+        self.env = env
+        self.bliques = list(bliques)
+        first = self.bliques[0]
+        assert(all(b.width == first.width and b.height == first.height for b in self.bliques))
+        self.width, self.height = first.width, first.height
+        self.max_age = first.max_age
+        self.age_step = ANIMATION_SPEED * 4
+        self.brains = PopulationBrain([b.brain for b in self.bliques]) if brains is None else brains
+        if scenarios is None:
+            self.rows = np.arange(len(self.bliques))
+            self.x = np.array([b.x for b in self.bliques])
+            self.y = np.array([b.y for b in self.bliques])
+            self.facing = np.array([b.facing for b in self.bliques])
+            self.age = np.array([b.age for b in self.bliques], dtype=float)
+            self.distance_traveled = np.array([b.distance_traveled for b in self.bliques])
+            self.alive = np.array([b.alive for b in self.bliques], dtype=bool)
+        else:
+            count = len(self.bliques) * len(scenarios)
+            self.rows = np.repeat(np.arange(len(self.bliques)), len(scenarios))
+            self.x, self.y, self.facing = np.tile(np.asarray(scenarios, dtype=int), (len(self.bliques), 1)).T
+            self.age = np.zeros(count)
+            self.distance_traveled = np.zeros(count, dtype=int)
+            self.alive = np.ones(count, dtype=bool)
+        self.first = np.searchsorted(self.rows, np.arange(len(self.bliques)))
+        self.fast_forward = first.fast_forward and fast_forward
+        self.history = [self.snapshot()]
+        self.record = record
+        if record:
+            self.trace = [(self.x.copy(), self.y.copy(), self.facing.copy())]
+            self.steps = np.zeros(len(self.x), dtype=int)
+            self.cycles = np.zeros((len(self.x), 2), dtype=int)
+
+    def snapshot(self):
+        """Returns copies of the position, facing and distance arrays"""
+        return self.x.copy(), self.y.copy(), self.facing.copy(), self.distance_traveled.copy()
+
+    def eyes(self, x, y, facing):
+        """Vectorized Blique.set_eye, returning the eye coordinates"""
+        eye_x = x + np.choose(facing, [self.width // 2, self.width - 1, self.width // 2, 0])
+        eye_y = y + np.choose(facing, [0, self.height // 2, self.height - 1, self.height // 2])
+        return eye_x, eye_y
+
+    def look_ahead(self, x, y, facing):
+        """Vectorized Blique.look_ahead using the Environment's distance tables"""
+        eye_x, eye_y = self.eyes(x, y, facing)
+        return self.env.look_ahead(eye_x, eye_y, facing)
+
+    def collides(self, x, y):
+        """Returns true for each blique whose footprint covers a non passable tile"""
+        return self.env.blocked(x, y, self.width, self.height)
+
+    def tick(self):
+        """Advances every living blique by one step"""
+        idx = np.flatnonzero(self.alive)
+        x, y, facing = self.x[idx], self.y[idx], self.facing[idx]
+        turn, turn_dir, m1, m2 = self.brains.lookup(self.look_ahead(x, y, facing), self.rows[idx]).T
+
+        # Same precedence as Blique.next_move: m1 << (1 + m2)
+        amt = np.where(turn, 0, m1 << 1 + m2)
+        facing = np.where(turn, (facing + np.where(turn_dir, 1, -1)) % 4, facing)
+        x = x + DX[facing] * amt
+        y = y + DY[facing] * amt
+        self.x[idx], self.y[idx], self.facing[idx] = x, y, facing
+        self.distance_traveled[idx] += amt
+
+        dead = (self.age[idx] > self.max_age) | self.collides(x, y)
+        self.alive[idx[dead]] = False
+        self.age[idx[~dead]] += self.age_step
+        if self.record:
+            self.trace.append((self.x.copy(), self.y.copy(), self.facing.copy()))
+            self.steps[idx] += 1
+        if self.fast_forward:
+            self.history = self.history[-self.cycle_window:] + [self.snapshot()]
+            self.detect_cycles(idx[~dead])
+
+    def detect_cycles(self, idx):
+        """The vectorized counterpart of Blique.detect_cycle for the living bliques in IDX,
+        only looking for cycles of up to cycle_window ticks"""
+        history = self.history
+        x, y, facing = self.x[idx], self.y[idx], self.facing[idx]
+        found = np.zeros(len(idx), dtype=bool)
+        for length in range(1, len(history)):
+            old_x, old_y, old_facing, old_distance = history[-1 - length]
+            match = ~found & (x == old_x[idx]) & (y == old_y[idx]) & (facing == old_facing[idx])
+            if not match.any():
+                continue
+            found |= match
+            rows = idx[match]
+            for age in np.unique(self.age[rows]):
+                same = rows[self.age[rows] == age]
+                gain = self.distance_traveled[same] - old_distance[same]
+                ticks, final_age = ticks_to_death(float(age), self.max_age, self.age_step)
+                # Steps since the start of the cycle, counting the step that kills
+                cycles, offset = divmod(length + ticks + 1, length)
+                end_x, end_y, end_facing, end_distance = history[-1 - length + offset]
+                self.x[same], self.y[same], self.facing[same] = end_x[same], end_y[same], end_facing[same]
+                self.distance_traveled[same] = end_distance[same] + cycles * gain
+                self.age[same] = final_age
+                self.alive[same] = False
+                if self.record:
+                    self.cycles[same] = length, ticks + 1
+
+    def trajectories(self, generation):
+        """Returns the recorded paths of the bliques as Trajectories"""
+        eye_x, eye_y = self.eyes(0, 0, np.arange(4))
+        return Trajectories.encode(generation, self.trace, self.steps, self.cycles, self.bliques,
+                                   np.column_stack([eye_x, eye_y]), self.env.grid.shape)
+
+    def fitness(self):
+        """Returns the fitness of every row, as Blique.fitness would"""
+        return (self.distance_traveled * 5 + self.age).astype(int)
+
+    def sync(self):
+        """Writes the array state back onto the Blique objects, taking the first row
+        of each blique"""
+        for i, b in zip(self.first, self.bliques):
+            b.alive = bool(self.alive[i])
+            b.age = float(self.age[i])
+            b.distance_traveled = int(self.distance_traveled[i])
+            b.x, b.y, b.facing = int(self.x[i]), int(self.y[i]), int(self.facing[i])
+            b.set_eye()
+
 class Brain:
-    """Basic neural network"""
+    """Basic neural network. The weights of each layer are kept as tuples of tuples."""
+    __slots__ = ('num_in', 'num_out', 'conv_size', 'layer1', 'layer2', 'table', 'inputs', 'conv_layer', 'output',
+                 'evaluations')
+
     def __init__(self, num_in, num_out, conv_size, init=False):
         self.num_in = num_in
         self.num_out = num_out
         self.conv_size = conv_size
+        self.table = None
+        # Number of times the network has actually been run, lookups aside
+        self.evaluations = 0
         if init:
             self.set_layer1_weights([[random.uniform(-1, 1) for _ in range(conv_size)] for _ in range(num_in)])
             self.set_layer2_weights([[random.uniform(-1, 1) for _ in range(num_out)] for _ in range(conv_size)])
@@ -377,12 +1194,26 @@ class Brain:
         the convolution later to the final output. Must have the number of inputs defined
         for this Brain"""
         assert(len(inputs) == self.num_in)
+        self.evaluations += 1
         self.inputs = inputs
         self.conv_layer = self.convolve(self.inputs, self.layer1)
         self.output = self.convolve(self.conv_layer, self.layer2)
         self.output = [round(x) for x in self.output]
         return self.output
 
+    def compile(self):
+        """Turns on the lookup table of a single input network. The output for an input
+        is computed by process the first time that input is seen and looked up after."""
+        assert(self.num_in == 1)
+        self.table = {}
+
+    def lookup(self, value):
+        """Returns the same output as process(VALUE) from the compiled table"""
+        output = self.table.get(value)
+        if output is None:
+            output = self.table[value] = self.process(value)
+        return output
+
     def convolve(self, inputs, weight_set):
         """Given a list of INPUTS and WEIGHT_SET, a list of list of edge weights. Element
         j from list i from WEIGHT_SET is the edge weight from input i to node j in the
@@ -399,7 +1230,7 @@ class Brain:
         single input."""
         assert(len(weights) == self.num_in)
         assert(all(len(w) == self.conv_size for w in weights))
-        self.layer1 = weights
+        self.layer1 = tuple(map(tuple, weights))
 
     def set_layer2_weights(self, weights):
         """sets the edge weights for layer 2 of the network, where WEIGHTS is an iterable
@@ -407,7 +1238,67 @@ class Brain:
         for a single colnvolution layer node."""
         assert(len(weights) == self.conv_size)
         assert(all(len(w) == self.num_out for w in weights))
-        self.layer2 = weights
+        self.layer2 = tuple(map(tuple, weights))
+
+class PopulationBrain:
+    """The Brains of a whole population stacked into arrays so that one tick's outputs
+    for every brain are computed in a single vectorized pass. Row i of each layer holds
+    the weights of the i-th brain given to the constructor."""
+    def __init__(self, brains):
+        self.layer1 = np.array([b.layer1 for b in brains], dtype=float)
+        self.layer2 = np.array([b.layer2 for b in brains], dtype=float)
+        # The sorted (row, input) keys of the inputs seen so far, with the outputs for
+        # each packed one bit per output into a byte. A brain sees few distinct
+        # inputs, so this stays far smaller than a table over every input.
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros(0, dtype=np.uint8)
+        self.bits = (1 << np.arange(self.layer2.shape[2])).astype(np.uint8)
+        self.evaluations = 0
+
+    def process(self, inputs, rows=None):
+        """Returns the rounded outputs of the brains in ROWS (all brains if None) as an
+        integer array with one row per brain. INPUTS holds one row of inputs per brain,
+        or a single input per brain for single input networks. Produces the same outputs
+        as Brain.process on each brain."""
+        layer1, layer2 = self.layer1, self.layer2
+        if rows is not None:
+            layer1, layer2 = layer1[rows], layer2[rows]
+        inputs = np.asarray(inputs, dtype=float).reshape(len(layer1), -1)
+        self.evaluations += len(layer1)
+        conv_layer = self.convolve(inputs, layer1)
+        output = self.convolve(conv_layer, layer2)
+        return np.round(output).astype(int)
+
+    def lookup(self, inputs, rows=None):
+        """Returns the same outputs as process for single input networks, where INPUTS
+        holds one nonnegative integer input per brain. Outputs are memoized per brain
+        and input, so each brain only processes an input the first time it sees it."""
+        inputs = np.asarray(inputs, dtype=np.int64)
+        if rows is None:
+            rows = np.arange(len(self.layer1))
+        keys = np.asarray(rows, dtype=np.int64) << 32 | inputs
+        at = np.searchsorted(self.keys, keys)
+        found = at < len(self.keys)
+        found[found] = self.keys[at[found]] == keys[found]
+        if not found.all():
+            new, first = np.unique(keys[~found], return_index=True)
+            outputs = self.process(inputs[~found][first], np.asarray(rows)[~found][first])
+            codes = (outputs.astype(np.uint8) * self.bits).sum(axis=1, dtype=np.uint8)
+            place = np.searchsorted(self.keys, new)
+            self.keys = np.insert(self.keys, place, new)
+            self.codes = np.insert(self.codes, place, codes)
+            at = np.searchsorted(self.keys, keys)
+        return (self.codes[at, None] & self.bits != 0).astype(int)
+
+    @staticmethod
+    def convolve(inputs, weight_set):
+        """The vectorized counterpart of Brain.convolve. Inputs are accumulated in the
+        same order as Brain.convolve so the sums, and therefore the rounded outputs,
+        agree exactly."""
+        output_layer = np.zeros((weight_set.shape[0], weight_set.shape[2]))
+        for i in range(weight_set.shape[1]):
+            output_layer += weight_set[:, i, :] * inputs[:, i:i+1]
+        return 1 / (1 + np.exp(-(output_layer / 100)))
 
 class Tile:
     """A square in the environment that can be passable or not and looks like S in string form"""
@@ -437,5 +1328,65 @@ class Food(Tile):
     def __int__(self):
         return 3
 
+# Shared Tile instances, looked up by tile code
+TILES = {int(tile): tile for tile in (Tile(), Wall(), Food())}
+WALL = TILES[2]
+FOOD = TILES[3]
+PASSABLE = np.zeros(256, dtype=bool)
+for code, tile in TILES.items():
+    PASSABLE[code] = tile.passable
+
 if __name__ == '__main__':
-    curses.wrapper(main)
+    parser = argparse.ArgumentParser(description='Blique evolution simulator')
+    parser.add_argument('--headless', action='store_true', help='run without curses and report generations/sec')
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--size', type=int, default=15, help='population size')
+    parser.add_argument('--height', type=int, default=40)
+    parser.add_argument('--width', type=int, default=120)
+    parser.add_argument('--batched', action='store_true', help='evaluate all brains in one vectorized pass per tick')
+    parser.add_argument('--vectorized', action='store_true', help='advance the whole population as arrays each tick')
+    parser.add_argument('--workers', type=int, default=0, help='number of processes to simulate on')
+    parser.add_argument('--cache', type=int, default=0, help='memoize up to this many simulation outcomes')
+    parser.add_argument('--checkpoint', help='file to save the population to')
+    parser.add_argument('--checkpoint-every', type=int, default=10, help='generations between checkpoints')
+    parser.add_argument('--resume', help='checkpoint file to continue from')
+    parser.add_argument('--profile', type=argparse.FileType('w'), help='write per-generation timings as JSON lines to this file')
+    parser.add_argument('--map', help='map file to evolve on instead of an empty grid')
+    parser.add_argument('--scenarios', type=int, default=0, help='score every blique over this many random starts')
+    parser.add_argument('--scenario-maps', nargs='+', default=(), help='more map files to score bliques on with --scenarios')
+    parser.add_argument('--aggregate', choices=sorted(Environment.aggregates), default='mean',
+                        help='how scores over scenarios are combined into a fitness')
+    parser.add_argument('--patience', type=int, help='stop after this many generations without improvement')
+    parser.add_argument('--record', help='record the paths of every generation headless and save them to this file')
+    parser.add_argument('--replay', help='replay the champions recorded to this file')
+    parser.add_argument('--generation', type=int, help='with --replay, replay every blique of this generation')
+    parser.add_argument('--food', type=int, default=0, help='put this much food down and evolve bliques that forage for it')
+    parser.add_argument('--steady', type=int, default=0, metavar='K',
+                        help='evolve by replacing the K least fit bliques at a time, simulating only offspring')
+    parser.add_argument('--islands', type=int, default=0, help='evolve this many populations in separate processes')
+    args = parser.parse_args()
+    if args.record and args.steady:
+        parser.error('--record cannot record --steady runs')
+    if args.record and args.scenarios:
+        parser.error('--record cannot record --scenarios runs')
+    if args.record and args.food:
+        parser.error('--record cannot record --food runs')
+    if args.islands:
+        rate = run_islands(args.islands, args.generations, args.height, args.width, args.size)
+        print('{:.2f} generations/sec'.format(rate))
+    elif args.headless:
+        rate = run_headless(args.generations, args.height, args.width, args.size, args.batched, args.vectorized, args.workers, args.cache,
+                            args.checkpoint, args.checkpoint_every, args.resume, args.profile, args.map,
+                            args.scenarios, args.scenario_maps, args.aggregate, args.patience, args.record, args.food,
+                            args.steady)
+        print('{:.2f} generations/sec'.format(rate))
+    elif args.replay:
+        try:
+            recordings = recorded(args.replay, args.generation)
+        except ValueError as e:
+            parser.error(str(e))
+        import curses
+        curses.wrapper(replay, recordings, args.map)
+    else:
+        import curses
+        curses.wrapper(main, args.map)
@@ -1,39 +1,192 @@
 from genalg.biology import *
+from genalg import selection
+from genalg.instrument import phase
+from collections import namedtuple
+import heapq
+import numpy as np
 import time
 
 max_iter = 5000
 
-def evolve(pop, iterations=None, elitism=True, mutation=True):
-    """Evolves a population ITERATION times"""
-    gen = self.stepper(pop, iterations, elitism, mutation)
-    for current_pop in gen:
-        pass
-    return current_pop
+Generation = namedtuple('Generation', ['generation', 'population', 'fitness', 'best', 'average', 'fittest',
+                                       'diversity', 'evaluate_seconds', 'step_seconds'])
 
-def stepper(pop, iterations=None, tournament_size=10, elitism=True, mutation=True):
-    """Returns a generator. Calling next on this object will call step once and return
-    the resulting population."""
+class Plateau:
+    """
+    Follows the best fitness of successive generations. A run has plateaued once its
+    best fitness has not improved on the best so far by more than TOLERANCE for
+    PATIENCE generations in a row.
+    """
+
+    def __init__(self, patience, tolerance=0):
+        self.patience = patience
+        self.tolerance = tolerance
+        self.best = None
+        self.stale = 0
+
+    def update(self, best):
+        """
+        Records the best fitness BEST of the next generation, returning whether the
+        run has plateaued
+        """
+        if self.best is None or best > self.best + self.tolerance:
+            self.best = best
+            self.stale = 0
+        else:
+            self.stale += 1
+        return self.stale >= self.patience
+
+def diversity(pop):
+    """
+    Returns the fraction of individuals in POP whose genome is distinct
+    """
+    genomes = {(i.genome.bits, i.genome.length) for i in pop.individuals}
+    return len(genomes) / len(pop.individuals)
+
+def evolve(pop, iterations=None, elitism=True, mutation=True, **options):
+    """Evolves a population ITERATION times, or until stepper stops early given
+    OPTIONS, returning the last population"""
+    for generation in stepper(pop, iterations, elitism=elitism, mutation=mutation, **options):
+        pop = generation.population
+    return pop
+
+def stepper(pop, iterations=None, tournament_size=10, elitism=True, mutation=True, method='tournament',
+            evaluate=None, callbacks=(), patience=None, tolerance=0, target=None, min_diversity=None,
+            instrument=None):
+    """
+    Returns a generator that evolves POP one generation per call to next, yielding a
+    Generation summary of each population. The first population yielded is POP.
+    evaluate: called with each population before its fitness is read, e.g. to simulate it
+    callbacks: each is called with every summary, and may return True to stop the run
+    patience, tolerance: stop once the best fitness has plateaued, see Plateau
+    target: stop once the best fitness reaches TARGET
+    min_diversity: stop once the diversity of the population falls below MIN_DIVERSITY
+    The remaining arguments are passed on to step. Runs for at most ITERATIONS
+    generations.
+    """
     iterations = iterations or max_iter
+    plateau = Plateau(patience, tolerance) if patience else None
+    step_seconds = 0
     for i in range(iterations):
-        yield pop
-        pop = step(pop, iterations, tournament_size, elitism, mutation)
+        started = time.perf_counter()
+        if evaluate:
+            evaluate(pop)
+        fitness = selection.fitness_vector(pop)
+        fittest = int(fitness.argmax())
+        summary = Generation(i, pop, fitness, fitness[fittest], fitness.mean(), pop.individuals[fittest],
+                             diversity(pop), time.perf_counter() - started, step_seconds)
+        stop = [callback(summary) for callback in callbacks]
+        yield summary
+        if any(stop) or i == iterations - 1:
+            return
+        if target is not None and summary.best >= target:
+            return
+        if min_diversity is not None and summary.diversity < min_diversity:
+            return
+        if plateau and plateau.update(summary.best):
+            return
+        started = time.perf_counter()
+        pop = step(pop, tournament_size, elitism, mutation, method, fitness, instrument)
+        step_seconds = time.perf_counter() - started
 
-def step(pop, tournament_size=10, elitism=True, mutation=True):
+def step(pop, tournament_size=10, elitism=True, mutation=True, method='tournament', fitness=None, instrument=None):
     """
     Performs selection, crossover, then mutation on the current population.
     tournament_size: size of tournment for tournament selection
     elitism: keep fittest individual if true for next population
     mutation: include mutation when creating offspring in crossover
+    method: selection method, one of 'tournament', 'roulette' or 'rank'
+    fitness: fitness of each individual if already known, e.g. from a checkpoint
+    instrument: Instrument timing the 'select' and 'construct' phases
+    Fitness is computed once per individual and every parent is drawn in one batch.
     """
     new_pop = Population(size=pop.size, member=pop.member, initialize=False)
-    if elitism:
-        new_pop.add_individual(pop.get_fittest())
-    elitism_offset = 1 if elitism else 0
-    t_size = min(tournament_size, pop.size)
-
-    for _ in range(elitism_offset, pop.size):
-        parent1 = pop.tournament(t_size)
-        parent2 = pop.tournament(t_size)
-        offspring = parent1.mate(parent2, mutation)
-        new_pop.add_individual(offspring)
+    individuals = pop.individuals
+    with phase(instrument, 'select'):
+        if fitness is None:
+            fitness = selection.fitness_vector(pop)
+        fitness = np.asarray(fitness, dtype=float)
+        if elitism:
+            new_pop.add_individual(individuals[int(fitness.argmax())])
+        elitism_offset = 1 if elitism else 0
+        t_size = min(tournament_size, pop.size)
+
+        count = pop.size - elitism_offset
+        parents = selection.select(fitness, 2 * count, method, t_size).tolist()
+    with phase(instrument, 'construct'):
+        for i in range(count):
+            parent1 = individuals[parents[2 * i]]
+            parent2 = individuals[parents[2 * i + 1]]
+            offspring = parent1.mate(parent2, mutation)
+            new_pop.add_individual(offspring)
+    if instrument:
+        instrument.count('offspring', count)
     return new_pop
+
+class SteadyState:
+    """
+    Evolves POP by steady state replacement: each step breeds COUNT offspring from
+    parents selected by METHOD and puts them in place of the COUNT least fit
+    individuals. The fitness of every individual is kept with the population, and a
+    heap of (fitness, index) pairs yields the least fit, so only offspring are ever
+    evaluated. EVALUATE is called with a list of new individuals before their fitness
+    is read, e.g. to simulate them. The whole of POP is evaluated up front unless its
+    FITNESS is given.
+    """
+
+    def __init__(self, pop, fitness=None, count=2, tournament_size=10, method='tournament', mutation=True,
+                 evaluate=None, instrument=None):
+        self.pop = pop
+        self.count = min(count, pop.size)
+        self.tournament_size = min(tournament_size, pop.size)
+        self.method = method
+        self.mutation = mutation
+        self.evaluate = evaluate
+        self.instrument = instrument
+        if fitness is None:
+            if evaluate:
+                evaluate(list(pop.individuals))
+            fitness = selection.fitness_vector(pop)
+        self.fitness = np.array(fitness, dtype=float)
+        self.heap = [(f, i) for i, f in enumerate(self.fitness.tolist())]
+        heapq.heapify(self.heap)
+        self.births = 0
+
+    def step(self):
+        """
+        Breeds COUNT offspring, evaluates them and replaces the least fit individuals
+        with them, returning the offspring
+        """
+        individuals = self.pop.individuals
+        with phase(self.instrument, 'select'):
+            parents = selection.select(self.fitness, 2 * self.count, self.method, self.tournament_size).tolist()
+        with phase(self.instrument, 'construct'):
+            offspring = [individuals[parents[2 * i]].mate(individuals[parents[2 * i + 1]], self.mutation)
+                         for i in range(self.count)]
+        if self.evaluate:
+            self.evaluate(offspring)
+        # Every slot is taken off the heap before any child goes on it, so no child
+        # can replace a sibling
+        worst = [heapq.heappop(self.heap)[1] for _ in offspring]
+        for index, child in zip(worst, offspring):
+            individuals[index] = child
+            self.fitness[index] = child.fitness()
+            heapq.heappush(self.heap, (self.fitness[index], index))
+        self.births += self.count
+        if self.instrument:
+            self.instrument.count('offspring', self.count)
+        return offspring
+
+    def fittest(self):
+        """
+        Returns the fittest individual
+        """
+        return self.pop.individuals[int(self.fitness.argmax())]
+
+    def best(self):
+        """
+        Returns the best fitness in the population, as an int when it is whole like
+        the fitness of most individuals
+        """
+        best = self.fitness.max().item()
+        return int(best) if best.is_integer() else best
@@ -1,7 +1,9 @@
 import random
 
 class Genome:
-    """Represents genetic information as a bitarray"""
+    """Represents genetic information as a bitarray, packed into the bits of an int.
+    Bit i of the sequence is bit (length - 1 - i) of the int, so the int is the value
+    of the sequence read as a binary number."""
 
     mutation_rate = 0.015
     substitution_rate = 0.8
@@ -12,39 +14,55 @@ class Genome:
     MUTATION_INS = 0
     MUTATION_DEL = 0
 
+    __slots__ = ('bits', 'length')
+
     def __init__(self, genome_length, sequence=None):
-        if sequence:
-            self.sequence = sequence
+        """
+        SEQUENCE may be a list of bits or an int holding the packed bits. A random
+        sequence of GENOME_LENGTH bits is generated if it is not given.
+        """
+        if isinstance(sequence, int):
+            self.bits = sequence
+        elif sequence:
+            self.bits = int(''.join(str(int(b)) for b in sequence), 2)
         else:
-            self.sequence = list()
-            self.sequence.extend([random.choice([1, 0]) for _ in range(genome_length)])
+            self.bits = random.getrandbits(genome_length)
         self.length = genome_length
-        self.mutation_rates =   {
-                                self.substitution: self.substitution_rate,
-                                self.deletion: self.deletion_rate,
-                                self.insertion: self.insertion_rate,
-                                }
+
+    @property
+    def mutation_rates(self):
+        """
+        The mutation functions and their relative rates
+        """
+        return {
+                self.substitution: self.substitution_rate,
+                self.deletion: self.deletion_rate,
+                self.insertion: self.insertion_rate,
+                }
+
+    @property
+    def sequence(self):
+        """
+        The bitarray as a list of ints
+        """
+        if not self.length:
+            return []
+        return [int(b) for b in format(self.bits, '0{}b'.format(self.length))]
 
     def crossover(self, other, mutation):
         """
         Returns a new Gene that is the result of randomly selecting from either parent
         Gene. When Genes are unequally sized, 0's are appended to the shorter until they
-        are equal in length.
+        are equal in length. The selection is made for every bit at once with a random
+        bitmask.
         """
-        crossed = list()
-        seq1 = self.sequence[:]
-        seq2 = other.sequence[:]
-
-        diff = self.length - other.length
-        if diff > 0:
-            seq2.extend([0] * diff)
-        elif diff < 0:
-            seq1.extend([0] * abs(diff))
+        length = max(self.length, other.length)
+        seq1 = self.bits << (length - self.length)
+        seq2 = other.bits << (length - other.length)
+        mask = random.getrandbits(length)
+        crossed = (seq1 & mask) | (seq2 & ~mask)
 
-        for pair in zip(seq1, seq2):
-            crossed.append(random.choice(pair))
-
-        crossed_genome = Genome(len(crossed), crossed)
+        crossed_genome = Genome(length, crossed)
         if mutation:
             crossed_genome.mutate()
 
@@ -68,10 +86,11 @@ class Genome:
         Returns the mutation function to use based on the mutation rates defined for
         the class
         """
-        total = sum([w for m, w in self.mutation_rates.items()])
+        rates = self.mutation_rates
+        total = sum([w for m, w in rates.items()])
         r = random.uniform(0, total)
         upto = 0
-        for m, w in self.mutation_rates.items():
+        for m, w in rates.items():
             if upto + w >= r:
                 return m
             upto += w
@@ -81,32 +100,63 @@ class Genome:
         """
         Flips a the bit at index LOCATION
         """
-        self.sequence[location] = self.sequence[location] ^ 1
+        self.bits ^= 1 << (self.length - 1 - location)
         return Genome.MUTATION_SUB
 
     def deletion(self, location):
         """
         Deletes the bit at index LOCATION
         """
-        self.sequence.pop(location)
+        tail = self.length - 1 - location
+        head = self.bits >> (tail + 1)
+        self.bits = (head << tail) | (self.bits & ((1 << tail) - 1))
+        self.length -= 1
         return Genome.MUTATION_DEL
 
     def insertion(self, location):
         """
         Adds a random bit at LOCATION
         """
-        self.sequence.insert(location, random.choice([0, 1]))
-        return Genome.MUTATION_DEL
+        tail = self.length - location
+        head = (self.bits >> tail << 1) | random.getrandbits(1)
+        self.bits = (head << tail) | (self.bits & ((1 << tail) - 1))
+        self.length += 1
+        return Genome.MUTATION_INS
+
+    def slice_bits(self, i, j):
+        """
+        Returns the bits from index I up to J packed into an int. Like list slicing,
+        J is clipped to the length of the sequence.
+        """
+        j = min(j, self.length)
+        i = min(i, j)
+        return (self.bits >> (self.length - j)) & ((1 << (j - i)) - 1)
 
     def subsequence(self, i, j):
         """
         Returns a slice of the bitarray
-        TODO: Replace with slice override
         """
-        return self.sequence[i:j]
+        return self[i:j]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            i, j, step = key.indices(self.length)
+            if step != 1:
+                return self.sequence[key]
+            if j <= i:
+                return []
+            return [int(b) for b in format(self.slice_bits(i, j), '0{}b'.format(j - i))]
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError('genome index out of range')
+        return (self.bits >> (self.length - 1 - key)) & 1
+
+    def __len__(self):
+        return self.length
 
     def __iter__(self):
-        return iter([int(b) for b in self.sequence])
+        return iter(self.sequence)
 
     def __repr__(self):
         return 'gen' + str(self.sequence)[8:]
@@ -116,10 +166,11 @@ class Individual:
 
     genome_length = 20
 
+    __slots__ = ('genome', 'val')
+
     def __init__(self, genome=None):
         if genome:
             self.genome = genome
-            self.genome_length = genome.length
         else:
             self.genome = Genome(self.genome_length)
         self.read_genome()
@@ -135,10 +186,7 @@ class Individual:
         """
         By default, returns the bit value of the gene's bitarray.
         """
-        out = 0
-        for bit in self.genome:
-            out = (out << 1) | bit
-        self.val = out
+        self.val = self.genome.bits
 
     def fitness(self):
         """
@@ -192,9 +240,7 @@ class Population:
         Runs a tournamnet select of size SIZE, choosing SIZE random members from the
         population and choosing the fittest from the sample
         """
-        t = Population(member=self.member, initialize=False)
-        t.set_population(random.sample(self.individuals, size))
-        return t.get_fittest()
+        return max(random.sample(self.individuals, size), key=lambda i: i.fitness())
 
     def __iter__(self):
         return iter(self.individuals)
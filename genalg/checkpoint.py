@@ -0,0 +1,147 @@
+"""
+Binary checkpoints of a population and the state of the run evolving it.
+
+A checkpoint file is laid out as
+    header      MAGIC, version, generation, number of individuals, 64 bit words per
+                genome, offset of the string table, offset of the RNG state
+    records     one fixed size record per individual: genome length, fitness and the
+                genome bits as little endian 64 bit words. The records can be memory
+                mapped as a numpy structured array.
+    strings     name, first parent and second parent of each individual as length
+                prefixed utf-8 strings
+    rng         the state of the random module
+All integers are little endian.
+"""
+import random
+import struct
+import numpy as np
+from genalg.biology import *
+
+MAGIC = b'BLQCKPT\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIQIIQQ')
+
+def record_dtype(words):
+    """
+    The numpy dtype of a record holding a genome of WORDS 64 bit words
+    """
+    return np.dtype([('length', '<u4'), ('pad', '<u4'), ('fitness', '<f8'), ('bits', '<u8', (words,))])
+
+def pack_string(s):
+    data = s.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+def pack_rng(state):
+    """
+    Packs a state returned by random.getstate()
+    """
+    version, internal, gauss_next = state
+    return struct.pack('<I{}I?d'.format(len(internal)), version, *internal,
+                       gauss_next is not None, gauss_next or 0.0)
+
+def unpack_rng(data):
+    count = (len(data) - struct.calcsize('<I?d')) // 4
+    values = struct.unpack('<I{}I?d'.format(count), data)
+    has_gauss, gauss = values[-2:]
+    return values[0], tuple(values[1:-2]), gauss if has_gauss else None
+
+def save(path, pop, generation=0, fitness=None, rng_state=None):
+    """
+    Writes POP to a checkpoint at PATH along with the GENERATION counter and
+    RNG_STATE, by default the current state of the random module. FITNESS is the
+    fitness of each individual, computed with fitness() if not given. Names and
+    parents are taken from the individuals when they have them.
+    """
+    individuals = list(pop)
+    if fitness is None:
+        fitness = [i.fitness() for i in individuals]
+    rng_state = rng_state or random.getstate()
+    words = max([(i.genome.length + 63) // 64 for i in individuals] + [1])
+    records = np.zeros(len(individuals), dtype=record_dtype(words))
+    for record, ind, fit in zip(records, individuals, fitness):
+        record['length'] = ind.genome.length
+        record['fitness'] = fit
+        record['bits'] = np.frombuffer(ind.genome.bits.to_bytes(words * 8, 'little'), dtype='<u8')
+
+    strings = b''
+    for ind in individuals:
+        parents = getattr(ind, 'parents', None) or ('', '')
+        strings += pack_string(getattr(ind, 'name', '')) + pack_string(parents[0]) + pack_string(parents[1])
+
+    strings_offset = HEADER.size + records.nbytes
+    rng_offset = strings_offset + len(strings)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, generation, len(individuals), words, strings_offset, rng_offset))
+        f.write(records.tobytes())
+        f.write(strings)
+        f.write(pack_rng(rng_state))
+
+class Checkpoint:
+    """
+    A loaded checkpoint. RECORDS is a structured array of the individuals' genome
+    lengths, fitness and genome words, memory mapped from the file if requested.
+    """
+
+    def __init__(self, path, mmap=False):
+        with open(path, 'rb') as f:
+            magic, version, generation, count, words, strings_offset, rng_offset = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a version {} checkpoint'.format(path, VERSION))
+            dtype = record_dtype(words)
+            if mmap:
+                self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+            else:
+                self.records = np.frombuffer(f.read(dtype.itemsize * count), dtype=dtype)
+            f.seek(strings_offset)
+            strings = f.read(rng_offset - strings_offset)
+            self.rng_state = unpack_rng(f.read())
+        self.generation = generation
+        self.names, self.parents = [], []
+        pos = 0
+        for _ in range(count):
+            fields = []
+            for _ in range(3):
+                size, = struct.unpack_from('<H', strings, pos)
+                fields.append(strings[pos + 2:pos + 2 + size].decode('utf-8'))
+                pos += 2 + size
+            self.names.append(fields[0])
+            self.parents.append(tuple(fields[1:]) if any(fields[1:]) else None)
+
+    @property
+    def fitness(self):
+        return np.asarray(self.records['fitness'])
+
+    def __len__(self):
+        return len(self.records)
+
+    def genome(self, i):
+        """
+        Returns the Genome of the I-th individual
+        """
+        record = self.records[i]
+        return Genome(int(record['length']), int.from_bytes(record['bits'].tobytes(), 'little'))
+
+    def population(self, member):
+        """
+        Rebuilds the checkpointed population as MEMBER individuals, restoring names
+        and parents on members that have them
+        """
+        pop = Population(size=len(self), member=member, initialize=False)
+        for i in range(len(self)):
+            ind = member(genome=self.genome(i))
+            if hasattr(ind, 'parents'):
+                ind.name, ind.parents = self.names[i], self.parents[i]
+            pop.add_individual(ind)
+        return pop
+
+    def restore_rng(self):
+        """
+        Sets the state of the random module to the checkpointed state
+        """
+        random.setstate(self.rng_state)
+
+def load(path, mmap=False):
+    """
+    Loads the checkpoint at PATH, memory mapping its records if MMAP
+    """
+    return Checkpoint(path, mmap)
@@ -0,0 +1,74 @@
+"""
+Per-generation instrumentation. Code that supports it takes an optional Instrument
+and does nothing extra when it is None, so disabled instrumentation costs one check.
+"""
+from contextlib import contextmanager, nullcontext
+import json
+import time
+
+class Instrument:
+    """
+    Accumulates wall time per named phase and counts of named events over a
+    generation. Phases may nest; the time of a nested phase is not counted towards
+    the phase around it. Each call to emit sends the generation's record to CALLBACK
+    and/or writes it as a JSON line to STREAM, then starts a new record.
+    """
+
+    def __init__(self, callback=None, stream=None):
+        self.callback = callback
+        self.stream = stream
+        self.stack = []
+        self.reset()
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the body of the with statement as part of phase NAME
+        """
+        start = time.perf_counter()
+        self.stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.stack.pop()
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - nested
+            if self.stack:
+                self.stack[-1] += elapsed
+
+    def count(self, name, n=1):
+        """
+        Adds N to counter NAME
+        """
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def emit(self, **fields):
+        """
+        Sends the current record, with FIELDS added, and starts a new one. Returns the
+        record.
+        """
+        record = dict(fields)
+        record['wall'] = time.perf_counter() - self.started
+        record['phases'] = self.phases
+        record['counters'] = self.counters
+        if self.callback:
+            self.callback(record)
+        if self.stream:
+            self.stream.write(json.dumps(record) + '\n')
+            self.stream.flush()
+        self.reset()
+        return record
+
+def phase(instrument, name):
+    """
+    Returns a context manager timing phase NAME on INSTRUMENT, or one that does
+    nothing if INSTRUMENT is None
+    """
+    if instrument is None:
+        return nullcontext()
+    return instrument.phase(name)
@@ -0,0 +1,88 @@
+import multiprocessing
+import random
+from genalg.biology import *
+from genalg import alg
+
+def serialize(individuals):
+    """
+    Packs the genomes of INDIVIDUALS as (bits, length) pairs for sending between
+    processes.
+    """
+    return [(ind.genome.bits, ind.genome.length) for ind in individuals]
+
+def deserialize(genomes, member):
+    """
+    Rebuilds MEMBER individuals from a list of (bits, length) pairs.
+    """
+    return [member(genome=Genome(length, bits)) for bits, length in genomes]
+
+def destinations(islands, topology, seed, epoch):
+    """
+    Returns a list whose i-th entry is the island that island i sends its migrants
+    to at migration EPOCH. Every island sends to and receives from exactly one other
+    island. The random topology is a random cycle drawn from SEED and EPOCH, so all
+    islands agree on it without communicating.
+    """
+    if topology == 'ring':
+        return [(i + 1) % islands for i in range(islands)]
+    if topology == 'random':
+        order = list(range(islands))
+        random.Random(hash((seed, epoch))).shuffle(order)
+        dest = [0] * islands
+        for i, island in enumerate(order):
+            dest[island] = order[(i + 1) % islands]
+        return dest
+    raise ValueError('Unknown topology: {}'.format(topology))
+
+def island(index, member, size, generations, interval, migrants, topology, seed,
+           evaluate, inboxes, results, step_args):
+    """
+    Evolves a single island for GENERATIONS generations. Every INTERVAL generations
+    the top MIGRANTS individuals are sent to the island's destination and the
+    immigrants it receives replace its worst individuals. Puts the final population
+    as (bits, length, fitness) tuples on RESULTS.
+    """
+    random.seed(hash((seed, index)))
+    pop = Population(size=size, member=member, initialize=True)
+    for generation in range(1, generations + 1):
+        if evaluate:
+            evaluate(pop)
+        if migrants and generation % interval == 0 and len(inboxes) > 1:
+            ranked = sorted(pop.individuals, key=lambda i: i.fitness(), reverse=True)
+            dest = destinations(len(inboxes), topology, seed, generation // interval)
+            inboxes[dest[index]].put(serialize(ranked[:migrants]))
+            immigrants = deserialize(inboxes[index].get(), member)
+            pop.set_population(ranked[:len(ranked) - len(immigrants)] + immigrants)
+            if evaluate:
+                evaluate(pop)
+        if generation < generations:
+            pop = alg.step(pop, **step_args)
+    results.put((index, [(i.genome.bits, i.genome.length, i.fitness()) for i in pop]))
+
+def evolve_islands(member=Individual, islands=4, size=20, generations=100, interval=10,
+                   migrants=2, topology='ring', seed=0, evaluate=None, **step_args):
+    """
+    Evolves ISLANDS independent populations of MEMBER individuals of size SIZE, each in
+    its own process, for GENERATIONS generations. Every INTERVAL generations each
+    island sends its top MIGRANTS individuals, as packed genomes, to a neighbour
+    chosen by TOPOLOGY ('ring' or 'random'). EVALUATE, if given, is called with an
+    island's population whenever its fitness must be brought up to date, and must be
+    picklable. Remaining keyword arguments are passed to alg.step. Returns the final
+    populations, each a list of (genome, fitness) pairs, fittest first.
+    """
+    inboxes = [multiprocessing.Queue() for _ in range(islands)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=island, args=(
+                     i, member, size, generations, interval, migrants, topology, seed,
+                     evaluate, inboxes, results, step_args))
+                 for i in range(islands)]
+    for p in processes:
+        p.start()
+    final = [None] * islands
+    for _ in range(islands):
+        index, individuals = results.get()
+        final[index] = sorted([(Genome(length, bits), fitness) for bits, length, fitness in individuals],
+                              key=lambda pair: pair[1], reverse=True)
+    for p in processes:
+        p.join()
+    return final
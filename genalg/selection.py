@@ -0,0 +1,76 @@
+import random
+import numpy as np
+
+def fitness_vector(pop):
+    """
+    Returns the fitness of every individual in POP as an array, in population order.
+    """
+    return np.array([i.fitness() for i in pop.individuals], dtype=float)
+
+def default_rng():
+    """
+    Returns a numpy Generator seeded from the random module, so that seeding random
+    also makes selection reproducible.
+    """
+    return np.random.default_rng(random.getrandbits(64))
+
+def tournament(fitness, count, size=10, rng=None):
+    """
+    Runs COUNT tournament selections of SIZE distinct members each at once, returning
+    the index of the fittest member of each tournament. Ties go to the member drawn
+    first, as with Population.tournament.
+    """
+    rng = rng or default_rng()
+    n = len(fitness)
+    size = min(size, n)
+    if size * size > n:
+        # Duplicates would be common, so draw each tournament from a permutation
+        entrants = rng.random((count, n)).argsort(axis=1)[:, :size]
+    else:
+        entrants = rng.integers(0, n, (count, size))
+        while True:
+            drawn = np.sort(entrants, axis=1)
+            redraw = np.flatnonzero((drawn[:, 1:] == drawn[:, :-1]).any(axis=1))
+            if not len(redraw):
+                break
+            entrants[redraw] = rng.integers(0, n, (len(redraw), size))
+    winners = fitness[entrants].argmax(axis=1)
+    return entrants[np.arange(count), winners]
+
+def roulette(fitness, count, size=None, rng=None):
+    """
+    Runs COUNT fitness proportionate selections at once, returning the selected
+    indices. Fitness is shifted to be non-negative; if every fitness is equal the
+    selection is uniform. SIZE is unused.
+    """
+    rng = rng or default_rng()
+    weights = fitness - min(fitness.min(), 0)
+    total = weights.sum()
+    if total <= 0:
+        return rng.integers(0, len(fitness), count)
+    return rng.choice(len(fitness), count, p=weights / total)
+
+def rank(fitness, count, size=None, rng=None):
+    """
+    Runs COUNT linear rank selections at once, returning the selected indices. The
+    least fit individual has weight 1 and the fittest has weight len(FITNESS). SIZE is
+    unused.
+    """
+    rng = rng or default_rng()
+    ranks = np.empty(len(fitness))
+    ranks[fitness.argsort(kind='stable')] = np.arange(1, len(fitness) + 1)
+    return rng.choice(len(fitness), count, p=ranks / ranks.sum())
+
+methods = {
+    'tournament': tournament,
+    'roulette': roulette,
+    'rank': rank,
+}
+
+def select(fitness, count, method='tournament', tournament_size=10, rng=None):
+    """
+    Selects COUNT indices into FITNESS using METHOD, one of the names in METHODS.
+    """
+    if method not in methods:
+        raise ValueError('Unknown selection method: {}'.format(method))
+    return methods[method](fitness, count, tournament_size, rng)
@@ -0,0 +1,118 @@
+"""Map files for Environments too large to build tile by tile.
+
+A map file is a small header followed by the grid's tile codes, one byte per cell in
+row-major order, so the grid can be memory mapped straight from the file. Only the
+pages that are touched are read, and processes mapping the same file share them.
+
+    python maps.py text maze.txt maze.map        convert a text map ('#' or '█' walls, '+' food)
+    python maps.py random 4000 8000 big.map      generate a random map
+    python maps.py tables big.map                precompute look-ahead and collision tables
+
+Tables precomputed for a map are stored next to it as .npy files and memory mapped by
+every Environment that opens the map, instead of being rebuilt in each process.
+"""
+import argparse
+import os
+import struct
+import numpy as np
+
+MAGIC = b'BLQMAP\0\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIII12x')
+TABLES = ('mask', 'walls', 'distances')
+
+FLOOR, WALL, FOOD = 1, 2, 3
+CODES = {'#': WALL, '█': WALL, '+': FOOD}
+
+def save(path, grid):
+    """Writes GRID, a 2d array of tile codes, to a map file at PATH"""
+    grid = np.ascontiguousarray(grid, dtype=np.uint8)
+    height, width = grid.shape
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, height, width))
+        grid.tofile(f)
+
+def open_grid(path, mode='r'):
+    """Memory maps the grid of the map file at PATH. The default MODE is read only;
+    'c' maps it copy on write, so tiles can be changed without touching the file."""
+    with open(path, 'rb') as f:
+        magic, version, height, width = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a version {} map file'.format(path, VERSION))
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER.size, shape=(height, width))
+
+def from_text(lines):
+    """Returns the grid described by LINES of text. Rows are padded with floor to the
+    length of the longest line."""
+    lines = [line.rstrip('\n') for line in lines]
+    width = max(len(line) for line in lines)
+    grid = np.full((len(lines), width), FLOOR, dtype=np.uint8)
+    for y, line in enumerate(lines):
+        for x, char in enumerate(line):
+            grid[y, x] = CODES.get(char, FLOOR)
+    return grid
+
+def random_map(height, width, density=0.02, seed=0):
+    """Returns a HEIGHT x WIDTH grid walled at the edges with randomly placed horizontal
+    and vertical wall segments covering roughly DENSITY of the cells"""
+    rng = np.random.default_rng(seed)
+    grid = np.full((height, width), FLOOR, dtype=np.uint8)
+    grid[[0, -1], :] = WALL
+    grid[:, [0, -1]] = WALL
+    length = 8
+    segments = int(density * height * width / length)
+    for horizontal in (True, False):
+        count = segments // 2
+        ys = rng.integers(0, height, count)
+        xs = rng.integers(0, width, count)
+        for i in range(length):
+            if horizontal:
+                grid[ys, np.minimum(xs + i, width - 1)] = WALL
+            else:
+                grid[np.minimum(ys + i, height - 1), xs] = WALL
+    return grid
+
+def table_path(path, name):
+    return '{}.{}.npy'.format(path, name)
+
+def save_tables(path, env):
+    """Stores the look-ahead and collision tables of ENV, an Environment built from the
+    map at PATH, next to the map"""
+    for name in TABLES:
+        np.save(table_path(path, name), getattr(env, name))
+
+def load_tables(path, mode='r'):
+    """Memory maps the tables stored next to the map at PATH with MODE as for
+    open_grid, returning them in the order of TABLES, or None if they are missing or
+    older than the map"""
+    paths = [table_path(path, name) for name in TABLES]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    if any(os.path.getmtime(p) < os.path.getmtime(path) for p in paths):
+        return None
+    return [np.load(p, mmap_mode=mode) for p in paths]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create blique map files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    text = commands.add_parser('text', help='convert a text map')
+    text.add_argument('source')
+    text.add_argument('map')
+    rand = commands.add_parser('random', help='generate a random map')
+    rand.add_argument('height', type=int)
+    rand.add_argument('width', type=int)
+    rand.add_argument('map')
+    rand.add_argument('--density', type=float, default=0.02)
+    rand.add_argument('--seed', type=int, default=0)
+    tables = commands.add_parser('tables', help='precompute the tables of a map')
+    tables.add_argument('map')
+    args = parser.parse_args()
+
+    if args.command == 'text':
+        with open(args.source, encoding='utf-8') as f:
+            save(args.map, from_text(f))
+    elif args.command == 'random':
+        save(args.map, random_map(args.height, args.width, args.density, args.seed))
+    elif args.command == 'tables':
+        from blique import Environment
+        save_tables(args.map, Environment(None, None, [], grid=args.map))
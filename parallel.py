@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+from blique import Blique, Environment, PopulationState
+from genalg.biology import Genome
+
+# The Environment each worker process simulates on, built once by init_worker
+worker_env = None
+
+def init_worker(grid, settings):
+    """Builds the worker's copy of the Environment from GRID and applies the Blique
+    class SETTINGS (width, height, max_age, genome_length) of the parent process. GRID is either an
+    array of tile codes or the path of a map file, which every worker maps without
+    copying."""
+    global worker_env
+    Blique.width, Blique.height, Blique.max_age, Blique.genome_length = settings
+    if isinstance(grid, str):
+        worker_env = Environment(None, None, [], grid=grid)
+    else:
+        height, width = grid.shape
+        worker_env = Environment(height, width, [], grid=grid)
+
+def simulate_shard(seed, shard):
+    """Simulates the bliques described by SHARD, a list of (genome bits, genome length,
+    x, y, facing) tuples, until they are all dead. Returns an (alive, age,
+    distance_traveled, facing) tuple for each. The worker's random module is seeded
+    with SEED first so the shard's results do not depend on scheduling."""
+    random.seed(seed)
+    bliques = []
+    for bits, length, x, y, facing in shard:
+        blique = Blique(genome=Genome(length, bits), coord=(x, y))
+        blique.env = worker_env
+        blique.facing = facing
+        blique.set_eye()
+        bliques.append(blique)
+    state = PopulationState(worker_env, bliques)
+    while state.alive.any():
+        state.tick()
+    return list(zip(state.alive.tolist(), state.age.tolist(), state.distance_traveled.tolist(), state.facing.tolist()))
+
+class ParallelEvaluator:
+    """Simulates a population across a pool of worker processes. Bliques never
+    interact, so the population is split into shards that are simulated independently
+    on each worker's copy of the grid; only genomes and start states are sent out and
+    only final states are sent back. The grid is copied when the evaluator is made, so
+    later changes to the Environment's tiles are not seen by the workers. Grids from
+    map files are not copied: each worker maps the file itself."""
+
+    def __init__(self, env, workers=None, seed=0, member=Blique):
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.calls = 0
+        settings = (member.width, member.height, member.max_age, member.genome_length)
+        grid = env.map_path or env.grid
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(grid, settings))
+
+    def evaluate(self, bliques):
+        """Resets and simulates BLIQUES in parallel, writing each blique's final state
+        back onto it. Every shard gets its own seed derived from the evaluator's seed,
+        the number of previous calls and the shard's index."""
+        bliques = list(bliques)
+        for b in bliques:
+            b.reset()
+        starts = [(b.genome.bits, b.genome.length, b.x, b.y, b.facing) for b in bliques]
+        shard_size = -(-len(starts) // self.workers) or 1
+        shards = [starts[i:i + shard_size] for i in range(0, len(starts), shard_size)]
+        seeds = [hash((self.seed, self.calls, i)) for i in range(len(shards))]
+        self.calls += 1
+        results = []
+        for shard_results in self.pool.map(simulate_shard, seeds, shards):
+            results.extend(shard_results)
+        for b, (alive, age, distance_traveled, facing) in zip(bliques, results):
+            b.alive, b.age, b.distance_traveled, b.facing = alive, age, distance_traveled, facing
+            b.set_eye()
+
+    def close(self):
+        """Shuts down the worker processes"""
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
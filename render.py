@@ -0,0 +1,322 @@
+from collections import namedtuple
+import curses
+import queue
+import threading
+import time
+
+# What a renderer needs to draw a frame, copied out of the simulation so it can be
+# drawn while the simulation carries on
+Snapshot = namedtuple('Snapshot', 'generation bliques info')
+BliqueSnapshot = namedtuple('BliqueSnapshot', 'x y eye_x eye_y height image name')
+
+def addstr(stdscr, x, y, s, color=None):
+    try:
+        if color:
+            stdscr.addstr(y, x, s)
+        else:
+            stdscr.addstr(y, x, s)
+    except:
+        pass
+
+class CursesRenderer:
+    """Draws an Environment and its bliques to a viewbox and an infobox in a curses
+    screen. The Environment itself knows nothing about curses; it calls back into its
+    renderer at the start of a simulation and after every tick.
+
+    After a full update, frames are drawn incrementally: the renderer remembers the
+    characters it drew over the grid for the bliques and each frame only repaints the
+    cells that changed, and only rewrites infobox rows whose text changed. Window
+    updates are batched with noutrefresh and a single doupdate per frame.
+
+    Grids larger than the screen are shown through a viewport whose top left corner
+    is (LEFT, TOP) in grid coordinates; only the tiles inside it are ever read."""
+    infobox_width = 35
+
+    def __init__(self, animation_speed=0.05):
+        self.animation_speed = animation_speed
+        self.env = None
+        self.drawn = {}
+        self.info_lines = []
+        self.left, self.top = 0, 0
+
+    def attach(self, env):
+        """Binds the renderer to ENV and creates the windows sized to its grid"""
+        self.env = env
+        self.title = env.title
+        self.initialize_windows()
+
+    def initialize_windows(self):
+        """initializes the viewbox and infobox for the Environment"""
+        env = self.env
+        self.height = min(env.view_height, curses.LINES)
+        self.width = min(env.view_width, curses.COLS - self.infobox_width)
+        self.viewbox = curses.newwin(self.height, self.width, 0, 0)
+        self.infobox = curses.newwin(self.height, self.infobox_width, 0, self.width)
+        self.init_infobox()
+
+    def init_infobox(self):
+        """initializes the column headers for the infobox"""
+        self.infobox.border()
+        header = '{:<2} {:<5} {:<10} {:<3} {:<5}'.format('#', 'F', 'Name', 'Age', 'Distance')
+        delimeter = '-  -     ----       --- --------'
+        addstr(self.infobox, 1, 1, header)
+        addstr(self.infobox, 1, 2, delimeter)
+        self.infobox.refresh()
+
+    def look_at(self, x, y):
+        """Moves the viewport so that it is centred on (x, y) as far as the edges of the
+        grid allow. Takes effect on the next full update."""
+        env = self.env
+        self.left = max(0, min(x - self.width // 2, env.view_width - self.width))
+        self.top = max(0, min(y - self.height // 2, env.view_height - self.height))
+
+    def visible(self, x, y):
+        """Whether grid cell (x, y) is inside the viewport"""
+        return self.left <= x < self.left + self.width and self.top <= y < self.top + self.height
+
+    def add_blique_to_viewbox(self, blique, color=None):
+        """Draws a blique b at the coordinates (b.x, b.y)"""
+        x, y = blique.x - self.left, blique.y - self.top
+        for line in blique.image:
+            addstr(self.viewbox, x, y, line)
+            y += 1
+        addstr(self.viewbox, blique.eye_x - self.left, blique.eye_y - self.top, 'O')
+        addstr(self.viewbox, x, blique.y + blique.height - self.top, blique.name)
+
+    def undraw_blique(self, blique):
+        """Removes the blique b from it's coordinates"""
+        env = self.env
+        for dy in range(blique.height):
+            for dx in range(blique.width):
+                x, y = blique.x + dx, blique.y + dy
+                if self.visible(x, y):
+                    addstr(self.viewbox, x - self.left, y - self.top, str(env.tile(x, y)))
+        addstr(self.viewbox, blique.x - self.left, blique.y + blique.height - self.top, ' ' * len(blique.name))
+        self.viewbox.refresh()
+
+    def snapshot(self, alive):
+        """Returns a Snapshot of the ALIVE bliques to draw and of the infobox"""
+        env = self.env
+        bliques = [BliqueSnapshot(b.x, b.y, b.eye_x, b.eye_y, b.height, b.image, b.name) for b in alive]
+        info = [(b.fitness(), b.name, int(b.age), int(b.distance_traveled)) for b in env.bliques]
+        return Snapshot(env.generation, bliques, info)
+
+    def info(self, snapshot):
+        """Returns the lines of the infobox, keyed by row, for the bliques in SNAPSHOT
+        sorted by their fitness values"""
+        offset = 3
+        width = self.infobox_width - 2
+        lines = [(0, 'Generation: {}'.format(snapshot.generation).ljust(width - 1))]
+        for i, (fitness, name, age, distance) in enumerate(sorted(snapshot.info, key=lambda b: b[0], reverse=True)):
+            row = i + offset
+            info = '{:<2} {:<5} {:<10} {:<3} {:<4}'.format(i+1, fitness, name, age, distance)
+            lines.append((row, info.ljust(width)))
+        return lines
+
+    def update_info(self, snapshot=None):
+        """Updates the infobox rows whose text has changed since they were last drawn,
+        marking the infobox for the next doupdate if any did. Draws the population as
+        it is now unless given a SNAPSHOT"""
+        lines = self.info(snapshot or self.snapshot([]))
+        changed = False
+        for i, (row, line) in enumerate(lines):
+            if i >= len(self.info_lines) or self.info_lines[i] != (row, line):
+                addstr(self.infobox, 1, row, line)
+                changed = True
+        self.info_lines = lines
+        if changed:
+            self.infobox.noutrefresh()
+
+    def overlay(self, bliques):
+        """Returns the characters drawn over the grid for BLIQUES, keyed by the (x, y)
+        cell they are drawn in, leaving out cells outside the viewport"""
+        cells = {}
+        for b in bliques:
+            for dy, line in enumerate(b.image):
+                for dx, char in enumerate(line):
+                    cells[b.x + dx, b.y + dy] = char
+            cells[b.eye_x, b.eye_y] = 'O'
+            for dx, char in enumerate(b.name):
+                cells[b.x + dx, b.y + b.height] = char
+        return {(x, y): char for (x, y), char in cells.items() if self.visible(x, y)}
+
+    def paint(self, bliques):
+        """Draws BLIQUES, repainting only the cells that differ from the last frame"""
+        env = self.env
+        cells = self.overlay(bliques)
+        edge = False
+        left, top = self.left, self.top
+        for (x, y) in self.drawn:
+            if (x, y) not in cells:
+                addstr(self.viewbox, x - left, y - top, str(env.tile(x, y)))
+                edge = edge or x - left in (0, self.width - 1) or y - top in (0, self.height - 1)
+        for (x, y), char in cells.items():
+            if self.drawn.get((x, y)) != char:
+                addstr(self.viewbox, x - left, y - top, char)
+        self.drawn = cells
+        if edge:
+            self.viewbox.border()
+            addstr(self.viewbox, 1, 0, self.title)
+
+    def update(self, bliques=[]):
+        """Redraws the whole viewbox and infobox"""
+        env = self.env
+        self.viewbox.erase()
+        for row in range(self.height):
+            y = self.top + row
+            addstr(self.viewbox, 0, row, ''.join(str(env.tile(x, y)) for x in range(self.left, self.left + self.width)))
+        self.viewbox.border()
+        addstr(self.viewbox, 1, 0, self.title)
+        self.drawn = {}
+        self.paint(bliques)
+        self.info_lines = []
+        self.update_info()
+        self.viewbox.noutrefresh()
+        curses.doupdate()
+
+    def begin(self, animate):
+        """Called by the Environment before the first tick of a simulation"""
+        if not animate:
+            self.update()
+            addstr(self.viewbox, (self.width - len('SIMULATING')) // 2, self.height // 2, 'SIMULATING')
+            self.viewbox.refresh()
+
+    def draw(self, snapshot, animate):
+        """Draws SNAPSHOT, including the bliques in it only if ANIMATE"""
+        if animate:
+            self.paint(snapshot.bliques)
+            self.viewbox.noutrefresh()
+        self.update_info(snapshot)
+        curses.doupdate()
+
+    def due(self):
+        """Whether the Environment should call frame after this tick"""
+        return True
+
+    def frame(self, alive, animate):
+        """Called by the Environment after every tick with the bliques still ALIVE"""
+        self.draw(self.snapshot(alive), animate)
+        if animate:
+            time.sleep(self.animation_speed)
+
+    def end(self, animate):
+        """Called by the Environment once every blique is dead"""
+        pass
+
+    def replay(self, trajectories, indices=None):
+        """Animates the recorded TRAJECTORIES of the bliques at INDICES (all of them
+        if None) over the current grid, with the infobox showing their final state"""
+        image, height = trajectories.image, trajectories.height
+        names = trajectories.names
+        indices = range(len(trajectories)) if indices is None else indices
+        info = [(trajectories.fitness[i], names[i], int(trajectories.age[i]), int(trajectories.distance[i]))
+                for i in indices]
+        self.update()
+        for frame in trajectories.frames(indices):
+            bliques = [BliqueSnapshot(x, y, eye_x, eye_y, height, image, names[i]) for i, x, y, eye_x, eye_y in frame]
+            self.draw(Snapshot(trajectories.generation, bliques, info), True)
+            time.sleep(self.animation_speed)
+        self.draw(Snapshot(trajectories.generation, [], info), True)
+
+class ThreadedRenderer:
+    """Wraps a CursesRenderer so that drawing happens on a separate thread and never
+    holds up the simulation. The simulation publishes Snapshots to a bounded queue at
+    no more than FPS frames per second, and the render thread draws them as it can;
+    when the queue is full the oldest waiting frame is dropped. Calls that draw
+    directly, such as update, share a lock with the render thread.
+
+    A replay is drawn on the render thread too. Until it finishes, the simulation's
+    own frames are not drawn, so it can carry on evolving at full speed."""
+
+    def __init__(self, renderer, fps=20, queue_size=2):
+        self.renderer = renderer
+        self.interval = 1 / fps
+        self.queue = queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.last_frame = 0
+        self.dropped = 0
+        self.replaying = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def infobox_width(self):
+        return self.renderer.infobox_width
+
+    def attach(self, env):
+        with self.lock:
+            self.renderer.attach(env)
+        self.thread.start()
+
+    def discard_frames(self):
+        """Drops every frame waiting to be drawn"""
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def update(self, bliques=[]):
+        if self.replaying:
+            return
+        self.discard_frames()
+        with self.lock:
+            self.renderer.update(bliques)
+
+    def begin(self, animate):
+        if self.replaying:
+            return
+        self.discard_frames()
+        with self.lock:
+            self.renderer.begin(animate)
+
+    def due(self):
+        return not self.replaying and time.perf_counter() - self.last_frame >= self.interval
+
+    def frame(self, alive, animate):
+        self.last_frame = time.perf_counter()
+        self.publish((self.renderer.snapshot(alive), animate))
+
+    def end(self, animate):
+        if not self.replaying:
+            self.publish((self.renderer.snapshot([]), animate))
+
+    def replay(self, trajectories, indices=None):
+        """Queues TRAJECTORIES to be replayed on the render thread"""
+        self.replaying = True
+        self.discard_frames()
+        self.publish(('replay', trajectories, indices))
+
+    def publish(self, frame):
+        """Queues FRAME for the render thread, dropping the oldest queued frame if the
+        queue is full"""
+        while True:
+            try:
+                self.queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        """Draws queued frames, at most one every interval, until given None"""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            if frame[0] == 'replay':
+                with self.lock:
+                    self.renderer.replay(*frame[1:])
+                self.replaying = False
+                continue
+            start = time.perf_counter()
+            with self.lock:
+                self.renderer.draw(*frame)
+            time.sleep(max(0, self.interval - (time.perf_counter() - start)))
+
+    def close(self):
+        """Stops the render thread once it has drawn the frames already queued"""
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,122 @@
+"""A uniform grid spatial hash, for finding what is near a point without scanning
+every item.
+
+Items sit at integer points and are bucketed by the CELL_SIZE square cell their point
+falls in. Moving an item only touches the buckets when it changes cell, and a nearest
+query searches rings of cells outward from the query point, stopping as soon as no
+unsearched cell can hold anything closer.
+"""
+import math
+
+class SpatialHash:
+    """Hashable items, each at one integer point, bucketed in a uniform grid of
+    CELL_SIZE square cells"""
+
+    def __init__(self, cell_size=8):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.positions = {}
+        # Bounds of every cell that has held an item, limiting how far queries search
+        self.bounds = None
+
+    def cell(self, x, y):
+        """Returns the cell holding the point (x, y)"""
+        return x // self.cell_size, y // self.cell_size
+
+    def insert(self, item, x, y):
+        """Adds ITEM at (x, y), moving it there if it is already in the hash"""
+        if item in self.positions:
+            self.move(item, x, y)
+            return
+        self.positions[item] = x, y
+        cell = self.cell(x, y)
+        self.cells.setdefault(cell, set()).add(item)
+        cx, cy = cell
+        if self.bounds is None:
+            self.bounds = [cx, cy, cx, cy]
+        else:
+            bounds = self.bounds
+            bounds[0], bounds[1] = min(bounds[0], cx), min(bounds[1], cy)
+            bounds[2], bounds[3] = max(bounds[2], cx), max(bounds[3], cy)
+
+    def remove(self, item):
+        """Removes ITEM from the hash"""
+        cell = self.cell(*self.positions.pop(item))
+        bucket = self.cells[cell]
+        bucket.discard(item)
+        if not bucket:
+            del self.cells[cell]
+
+    def move(self, item, x, y):
+        """Moves ITEM to (x, y), only rebucketing it if it changes cell"""
+        old = self.positions[item]
+        if self.cell(*old) != self.cell(x, y):
+            self.remove(item)
+            self.insert(item, x, y)
+        else:
+            self.positions[item] = x, y
+
+    def ring(self, cx, cy, r):
+        """Yields the cells at Chebyshev distance R from the cell (cx, cy)"""
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def nearest(self, x, y, exclude=None, max_distance=None):
+        """Returns the item closest to (x, y) other than EXCLUDE, and its euclidean
+        distance, or (None, None) if there is none within MAX_DISTANCE"""
+        if not self.positions:
+            return None, None
+        size = self.cell_size
+        cx, cy = self.cell(x, y)
+        left, top, right, bottom = self.bounds
+        reach = max(cx - left, right - cx, cy - top, bottom - cy)
+        if max_distance is not None:
+            reach = min(reach, max_distance // size + 1)
+        best, best_squared = None, None
+        for r in range(reach + 1):
+            for cell in self.ring(cx, cy, r):
+                for item in self.cells.get(cell, ()):
+                    if item is exclude:
+                        continue
+                    ix, iy = self.positions[item]
+                    squared = (ix - x) ** 2 + (iy - y) ** 2
+                    if best is None or squared < best_squared:
+                        best, best_squared = item, squared
+            if best is not None:
+                # Nothing outside the searched square of cells can be closer than its edge
+                margin = min(x - (cx - r) * size, (cx + r + 1) * size - x,
+                             y - (cy - r) * size, (cy + r + 1) * size - y)
+                if best_squared <= margin * margin:
+                    break
+        if best is None:
+            return None, None
+        distance = math.sqrt(best_squared)
+        if max_distance is not None and distance > max_distance:
+            return None, None
+        return best, distance
+
+    def within(self, x, y, width, height):
+        """Returns the items in the WIDTH x HEIGHT rectangle with top left corner (x, y)"""
+        left, top = self.cell(x, y)
+        right, bottom = self.cell(x + width - 1, y + height - 1)
+        found = []
+        for cy in range(top, bottom + 1):
+            for cx in range(left, right + 1):
+                for item in self.cells.get((cx, cy), ()):
+                    ix, iy = self.positions[item]
+                    if x <= ix < x + width and y <= iy < y + height:
+                        found.append(item)
+        return found
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item):
+        return item in self.positions
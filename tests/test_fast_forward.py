@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+import maps
+from blique import Blique, Environment
+from genalg.biology import Population
+
+
+def simulate(seed, monkeypatch, fast_forward, **options):
+    """Returns the fitness of a random population drawn from SEED, simulated on a
+    walled grid with each blique started from a different free spot"""
+    monkeypatch.setattr(Blique, 'fast_forward', fast_forward)
+    random.seed(seed)
+    grid = maps.random_map(40, 120, density=0.05, seed=seed)
+    env = Environment(40, 120, [], grid=grid)
+    pop = Population(size=50, member=Blique)
+    starts = env.random_scenarios(len(pop.individuals), Blique.width, Blique.height, seed)
+    for blique, (x, y, _) in zip(pop.individuals, starts.tolist()):
+        blique.set_start((x, y))
+    env.set_population(pop)
+    env.simulate(**options)
+    return [b.fitness() for b in pop.individuals]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_fast_forward_keeps_fitness(seed, monkeypatch):
+    expected = simulate(seed, monkeypatch, False)
+    assert simulate(seed, monkeypatch, True) == expected
+    assert simulate(seed, monkeypatch, False, vectorized=True) == expected
+    assert simulate(seed, monkeypatch, True, vectorized=True) == expected
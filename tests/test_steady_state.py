@@ -0,0 +1,30 @@
+import genalg.alg as ga
+from genalg.biology import Population
+
+
+class Scored:
+    """An individual with a fixed fitness whose offspring score the values in
+    CHILDREN in turn"""
+    children = []
+
+    def __init__(self, value):
+        self.value = value
+
+    def fitness(self):
+        return self.value
+
+    def mate(self, other, mutation=True):
+        return Scored(Scored.children.pop(0))
+
+
+def test_step_replaces_the_k_worst():
+    pop = Population(member=Scored, initialize=False)
+    pop.set_population([Scored(v) for v in (10, 20, 30, 40, 50, 60)])
+    pop.size = 6
+    Scored.children = [1, 2]
+    evolution = ga.SteadyState(pop, count=2)
+    evolution.step()
+    assert sorted(i.value for i in pop.individuals) == [1, 2, 30, 40, 50, 60]
+    assert sorted(evolution.fitness.tolist()) == [1, 2, 30, 40, 50, 60]
+    assert sorted(evolution.heap) == sorted((f, i) for i, f in enumerate(evolution.fitness.tolist()))
+    assert evolution.best() == 60
@@ -0,0 +1,148 @@
+"""Recorded paths of bliques, for replaying a generation without simulating it again.
+
+A generation's paths are stored delta encoded: each blique's start (x, y, facing)
+and then one int8 (dx, dy, dfacing) row per tick, the rows of every blique
+concatenated with OFFSETS marking where each blique's rows begin. A blique that was
+fast forwarded out of a cycle is recorded up to the cycle, with the length of the
+cycle and the number of further ticks it ran; its remaining deltas are the last
+cycle's deltas repeated.
+
+A Recorder keeps the latest generations and the champion of every generation, and
+saves them to a single .npz file that can be replayed offline.
+"""
+from collections import OrderedDict
+import numpy as np
+
+class Trajectories:
+    """The delta encoded paths of a generation of bliques, with what the renderer
+    needs to draw them: the bliques' names, final fitness, age and distance, their
+    size and image, and the offset of the eye from the top left corner for each
+    facing."""
+    fields = ('starts', 'offsets', 'deltas', 'cycles', 'fitness', 'age', 'distance', 'names')
+
+    def __init__(self, generation, starts, offsets, deltas, cycles, fitness, age, distance, names,
+                 size, image, eyes, grid_shape):
+        self.generation = generation
+        self.starts, self.offsets, self.deltas, self.cycles = starts, offsets, deltas, cycles
+        self.fitness, self.age, self.distance = fitness, age, distance
+        self.names = [str(name) for name in names]
+        self.width, self.height = size
+        self.image = tuple(image)
+        self.eyes = eyes
+        self.grid_shape = tuple(grid_shape)
+
+    @classmethod
+    def encode(cls, generation, trace, steps, cycles, bliques, eyes, grid_shape):
+        """Encodes the paths in TRACE, a list of (x, y, facing) arrays with one entry
+        per blique for each tick, of which blique i moved for the first STEPS[i] ticks.
+        CYCLES holds the (length, ticks) of each fast forwarded cycle, zero if none."""
+        positions = np.stack([np.column_stack(t) for t in trace])
+        steps = np.asarray(steps)
+        deltas = [np.diff(positions[:n + 1, i], axis=0) for i, n in enumerate(steps)]
+        offsets = np.concatenate([[0], np.cumsum(steps)])
+        deltas = np.concatenate(deltas).astype(np.int8) if len(deltas) else np.zeros((0, 3), np.int8)
+        first = bliques[0]
+        return cls(generation, positions[0].astype(np.int32), offsets, deltas.reshape(-1, 3),
+                   np.asarray(cycles, dtype=np.int32).reshape(-1, 2),
+                   np.array([b.fitness() for b in bliques], dtype=float),
+                   np.array([b.age for b in bliques], dtype=float),
+                   np.array([b.distance_traveled for b in bliques]),
+                   [b.name for b in bliques], (first.width, first.height), first.image, eyes, grid_shape)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def fittest(self):
+        """Returns the index of the fittest blique"""
+        return int(self.fitness.argmax())
+
+    def subset(self, indices):
+        """Returns the Trajectories of just the bliques at INDICES"""
+        indices = list(indices)
+        lengths = np.diff(self.offsets)[indices]
+        deltas = [self.deltas[self.offsets[i]:self.offsets[i + 1]] for i in indices]
+        return Trajectories(self.generation, self.starts[indices], np.concatenate([[0], np.cumsum(lengths)]),
+                            np.concatenate(deltas).reshape(-1, 3), self.cycles[indices], self.fitness[indices],
+                            self.age[indices], self.distance[indices], [self.names[i] for i in indices],
+                            (self.width, self.height), self.image, self.eyes, self.grid_shape)
+
+    def path(self, i):
+        """Returns the (x, y, facing) of blique I after every tick, starting with its
+        start, as an array with a row per tick"""
+        deltas = self.deltas[self.offsets[i]:self.offsets[i + 1]].astype(int)
+        length, ticks = self.cycles[i]
+        if length:
+            cycle = deltas[len(deltas) - length:]
+            deltas = np.concatenate([deltas, np.resize(cycle, (ticks, 3))])
+        path = np.cumsum(np.concatenate([self.starts[i:i + 1], deltas]), axis=0)
+        path[:, 2] %= 4
+        return path
+
+    def frames(self, indices=None):
+        """Yields, for every tick, a list of (index, x, y, eye_x, eye_y) for each of the
+        bliques at INDICES (all of them if None) that is still moving"""
+        indices = range(len(self)) if indices is None else indices
+        paths = {i: self.path(i).tolist() for i in indices}
+        eyes = np.asarray(self.eyes).tolist()
+        for tick in range(max(len(p) for p in paths.values())):
+            frame = []
+            for i, path in paths.items():
+                if tick < len(path):
+                    x, y, facing = path[tick]
+                    frame.append((i, x, y, x + eyes[facing][0], y + eyes[facing][1]))
+            yield frame
+
+    def arrays(self, prefix):
+        """Returns the Trajectories as a dict of arrays with keys starting with PREFIX"""
+        arrays = {prefix + field: np.asarray(getattr(self, field)) for field in self.fields}
+        arrays[prefix + 'meta'] = np.array([self.generation, self.width, self.height] + list(self.grid_shape))
+        arrays[prefix + 'image'] = np.array(self.image)
+        arrays[prefix + 'eyes'] = np.asarray(self.eyes)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """Rebuilds Trajectories saved by arrays with PREFIX"""
+        generation, width, height, grid_height, grid_width = arrays[prefix + 'meta'].tolist()
+        values = [arrays[prefix + field] for field in cls.fields]
+        return cls(generation, *values, (width, height), arrays[prefix + 'image'].tolist(),
+                   arrays[prefix + 'eyes'], (grid_height, grid_width))
+
+class Recorder:
+    """Keeps the Trajectories of the KEEP latest recorded generations, and of the
+    champion of every recorded generation"""
+
+    def __init__(self, keep=10):
+        self.keep = keep
+        self.generations = OrderedDict()
+        self.champions = OrderedDict()
+
+    def add(self, trajectories):
+        """Stores TRAJECTORIES, dropping the oldest generation if there are too many"""
+        generation = trajectories.generation
+        self.generations[generation] = trajectories
+        self.champions[generation] = trajectories.subset([trajectories.fittest()])
+        while len(self.generations) > self.keep:
+            self.generations.popitem(last=False)
+
+    def save(self, path):
+        """Writes every stored generation and champion to the .npz file PATH"""
+        arrays = {}
+        for kind, stored in (('generation', self.generations), ('champion', self.champions)):
+            for generation, trajectories in stored.items():
+                arrays.update(trajectories.arrays('{}/{}/'.format(kind, generation)))
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a Recorder saved to PATH"""
+        recorder = cls()
+        with np.load(path) as arrays:
+            keys = {key.rsplit('/', 1)[0] + '/' for key in arrays.files}
+            for prefix in sorted(keys, key=lambda p: int(p.split('/')[1])):
+                kind = prefix.split('/')[0]
+                stored = recorder.generations if kind == 'generation' else recorder.champions
+                trajectories = Trajectories.from_arrays(arrays, prefix)
+                stored[trajectories.generation] = trajectories
+        recorder.keep = max(len(recorder.generations), 1)
+        return recorder